@@ -0,0 +1,85 @@
+"""
+Admin building blocks for tables with millions of rows.
+"""
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Exists, OuterRef, QuerySet
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that reads the planner's row estimate of an unfiltered
+    PostgreSQL table instead of running ``COUNT(*)`` over all of it.
+
+    Small tables, filtered querysets and other backends get the exact count.
+    """
+
+    estimate_threshold = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                        [queryset.model._meta.db_table],
+                    )
+                    row = cursor.fetchone()
+                if row and row[0] >= self.estimate_threshold:
+                    return row[0]
+        return super().count
+
+
+class InputFilter(admin.SimpleListFilter):
+    """
+    List filter with a text input instead of a link per value, for fields
+    with too many distinct values to list in the sidebar.
+    """
+
+    template = "admin/input_filter.html"
+    lookup = None
+
+    def lookups(self, request, model_admin):
+        # A non-empty value makes the admin render the filter.
+        return ((None, None),)
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice["query_parts"] = [
+            (key, value)
+            for key, values in changelist.get_filters_params().items()
+            if key != self.parameter_name
+            for value in values
+        ]
+        yield all_choice
+
+    def queryset(self, request, queryset):
+        value = (self.value() or "").strip()
+        if value:
+            return queryset.filter(**{self.lookup: value})
+        return queryset
+
+
+class HasRelationFilter(admin.SimpleListFilter):
+    """Yes/no filter on whether a related row exists, as an ``EXISTS`` subquery."""
+
+    related_model = None
+    related_field = None
+
+    def lookups(self, request, model_admin):
+        return (("yes", "Да"), ("no", "Нет"))
+
+    def queryset(self, request, queryset):
+        exists = Exists(
+            self.related_model.objects.filter(**{self.related_field: OuterRef("pk")})
+        )
+        if self.value() == "yes":
+            return queryset.filter(exists)
+        if self.value() == "no":
+            return queryset.filter(~exists)
+        return queryset
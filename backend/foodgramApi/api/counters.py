@@ -0,0 +1,91 @@
+"""
+Denormalized counters on ``Recipe`` and ``User``.
+
+The counters are changed with ``F()`` updates in the transaction that
+creates or deletes the related row, so concurrent writers never lose an
+increment. ``reconcile_counters`` recomputes them from the relation tables.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import (
+    Case, Count, F, IntegerField, Max, OuterRef, PositiveIntegerField, Subquery, Value, When,
+)
+from django.db.models.functions import Coalesce
+
+from recipes.models import Recipe
+from .models import Favorite, ShoppingCart, Subscription
+
+User = get_user_model()
+
+# (model, counter field, related model, field of the related model pointing at it)
+COUNTERS = (
+    (Recipe, "favorites_count", Favorite, "recipe"),
+    (Recipe, "in_carts_count", ShoppingCart, "recipe"),
+    (User, "recipes_count", Recipe, "author"),
+    (User, "followers_count", Subscription, "author"),
+    (User, "following_count", Subscription, "user"),
+)
+# Recipe counter kept for each user list relation.
+RECIPE_COUNTERS = {Favorite: "favorites_count", ShoppingCart: "in_carts_count"}
+
+
+def adjust_counter(model, pks, field, delta):
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        # Never go below zero on drifted counters; reconciliation repairs them.
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def adjust_follow_counters(user_id, author_id, delta):
+    """Change ``following_count`` of the user and ``followers_count`` of the author in one query."""
+    User.objects.filter(pk__in=[user_id, author_id]).update(
+        following_count=Case(
+            When(pk=user_id, following_count__gte=-delta, then=F("following_count") + delta),
+            default=F("following_count"),
+            output_field=PositiveIntegerField(),
+        ),
+        followers_count=Case(
+            When(pk=author_id, followers_count__gte=-delta, then=F("followers_count") + delta),
+            default=F("followers_count"),
+            output_field=PositiveIntegerField(),
+        ),
+    )
+
+
+def count_subquery(model, field):
+    """Number of ``model`` rows whose ``field`` points at the outer row."""
+    counts = (
+        model.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def reconcile_counter(model, field, related_model, related_field, batch_size=None):
+    """
+    Recompute ``model.<field>`` from the rows of ``related_model`` and return
+    the number of rows that had drifted. Works in primary key ranges of
+    ``batch_size`` when it is given, each committed in its own transaction so
+    a large table is never locked as a whole.
+    """
+    actual = count_subquery(related_model, related_field)
+    queryset = model._default_manager.order_by()
+    if batch_size is None:
+        ranges = [queryset]
+    else:
+        last_pk = queryset.aggregate(last=Coalesce(Max("pk"), Value(0)))["last"]
+        ranges = (
+            queryset.filter(pk__gte=start, pk__lt=start + batch_size)
+            for start in range(0, last_pk + 1, batch_size)
+        )
+    fixed = 0
+    for rows in ranges:
+        with transaction.atomic():
+            fixed += rows.alias(actual=actual).exclude(**{field: F("actual")}).update(
+                **{field: actual}
+            )
+    return fixed
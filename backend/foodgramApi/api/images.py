@@ -0,0 +1,135 @@
+"""
+Resized renditions of uploaded images.
+
+Every rendition is stored next to its original as ``<stem>__<size>.<ext>``,
+once in the format of the original and once as WebP. Renditions are written
+when an image is saved and generated on first access when they are missing.
+"""
+import logging
+import posixpath
+import time
+from collections import OrderedDict
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+RENDITION_SIZES = {
+    "recipe": {"card": (300, 300), "detail": (800, 800)},
+    "avatar": {"avatar": (128, 128)},
+}
+RENDITION_SEPARATOR = "__"
+WEBP = "webp"
+PIL_FORMATS = {"jpg": "JPEG", "jpeg": "JPEG", "png": "PNG", "gif": "GIF", "webp": "WEBP"}
+
+
+def rendition_names(name, kind):
+    """``{size: {ext: name}}`` of the renditions of the image ``name``."""
+    root, ext = posixpath.splitext(name)
+    ext = ext.lstrip(".").lower()
+    formats = [ext, WEBP] if ext in PIL_FORMATS and ext != WEBP else [WEBP]
+    return {
+        size: {fmt: f"{root}{RENDITION_SEPARATOR}{size}.{fmt}" for fmt in formats}
+        for size in RENDITION_SIZES[kind]
+    }
+
+
+def render(image, bounds, fmt):
+    rendition = image.copy()
+    rendition.thumbnail(bounds)
+    pil_format = PIL_FORMATS[fmt]
+    if pil_format == "JPEG" and rendition.mode not in ("RGB", "L"):
+        rendition = rendition.convert("RGB")
+    elif pil_format == "WEBP" and rendition.mode not in ("RGB", "RGBA"):
+        rendition = rendition.convert("RGBA")
+    buffer = BytesIO()
+    rendition.save(buffer, format=pil_format)
+    return buffer.getvalue()
+
+
+def generate_renditions(storage, name, kind):
+    """Write the renditions of ``name`` that are not stored yet."""
+    names = rendition_names(name, kind)
+    missing = [
+        (size, fmt, rendition_name)
+        for size, formats in names.items()
+        for fmt, rendition_name in formats.items()
+        if not storage.exists(rendition_name)
+    ]
+    if missing:
+        # Content-addressed storage would rename the files by their hash.
+        save = getattr(storage, "save_derived", storage.save)
+        with storage.open(name) as original, Image.open(original) as image:
+            image.load()
+            for size, fmt, rendition_name in missing:
+                content = render(image, RENDITION_SIZES[kind][size], fmt)
+                save(rendition_name, ContentFile(content))
+    return names
+
+
+class RenditionCache:
+    """
+    In-process LRU of rendition names per ``(storage, name, kind)``.
+
+    Failures are remembered as ``None`` for ``negative_ttl`` seconds, so a
+    missing or unreadable original is not looked up and opened again on
+    every request, yet a worker notices when it appears later.
+    """
+
+    def __init__(self, maxsize=4096, negative_ttl=300):
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """``(found, names)``; ``found`` is false for unknown or expired keys."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        names, expires = entry
+        if expires is not None and expires < time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, names
+
+    def set(self, key, names):
+        expires = None if names is not None else time.monotonic() + self.negative_ttl
+        self._entries[key] = (names, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+rendition_cache = RenditionCache()
+
+
+def get_rendition_names(field_file, kind, use_cache=True):
+    """
+    Names of the renditions of ``field_file``, generating missing ones.
+
+    Results are remembered in process, so repeat calls do not touch the
+    storage; ``use_cache=False`` generates afresh and refreshes the entry.
+    Returns ``None`` when the original cannot be read.
+    """
+    if not field_file:
+        return None
+    key = (field_file.storage, field_file.name, kind)
+    if use_cache:
+        found, names = rendition_cache.get(key)
+        if found:
+            return names
+    try:
+        names = generate_renditions(field_file.storage, field_file.name, kind)
+    except FileNotFoundError:
+        names = None
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.warning("Cannot render %s", field_file.name, exc_info=True)
+        names = None
+    rendition_cache.set(key, names)
+    return names
@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.query_plans import check_plan, explain, get_large_tables, hot_queries, pick_user
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the hot API queries and fail on sequential scans of large "
+        "tables or plans over the cost budget. Run against a dataset from "
+        "generate_dataset on PostgreSQL"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seq-scan-threshold", type=int, default=10000,
+            help="Estimated rows above which a sequential scan of a table fails the check",
+        )
+        parser.add_argument(
+            "--max-cost", type=float, default=5000,
+            help="Highest estimated total cost a plan may have",
+        )
+        parser.add_argument(
+            "--user", type=int, default=None,
+            help="Id of the user to run the queries as, the user with the most favorites by default",
+        )
+        parser.add_argument("--analyze", action="store_true", help="Run ANALYZE first")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Query plan checks need PostgreSQL.")
+        if options["analyze"]:
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+        if options["user"] is None:
+            user = pick_user()
+            if user is None:
+                raise CommandError("No users; run generate_dataset first.")
+        else:
+            try:
+                user = User.objects.get(pk=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist.")
+
+        large_tables = get_large_tables(options["seq_scan_threshold"])
+        failed = []
+        for name, queryset in hot_queries(user).items():
+            plan = explain(queryset)
+            problems = check_plan(plan, large_tables, options["max_cost"])
+            line = f"{name}: cost {plan['Total Cost']:.0f}"
+            if problems:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f"{line}, {'; '.join(problems)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(line))
+
+        if failed:
+            raise CommandError(f"Plan regressions in: {', '.join(failed)}")
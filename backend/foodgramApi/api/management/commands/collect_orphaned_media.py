@@ -0,0 +1,129 @@
+import os
+import posixpath
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from api.images import PIL_FORMATS, RENDITION_SEPARATOR
+from api.models import MediaBlob
+from recipes.models import Recipe
+
+User = get_user_model()
+
+MEDIA_FIELDS = ((Recipe, "image"), (User, "avatar"))
+
+
+def iter_files(root, directory):
+    """Yield ``os.DirEntry`` objects of the files below ``directory``."""
+    pending = [os.path.join(root, directory)]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except FileNotFoundError:
+            continue
+
+
+def original_names(name):
+    """Names of the images a file may belong to: itself or, for a rendition, its original."""
+    stem, separator, _ = name.rpartition(RENDITION_SEPARATOR)
+    if not separator:
+        return [name]
+    return [name] + [f"{stem}.{ext}" for ext in PIL_FORMATS]
+
+
+def referenced_names(names):
+    """The subset of ``names`` referenced by a model row or a media blob."""
+    referenced = set()
+    for model, field_name in MEDIA_FIELDS:
+        referenced.update(
+            model.objects.filter(**{f"{field_name}__in": names})
+            .values_list(field_name, flat=True)
+        )
+    referenced.update(MediaBlob.objects.filter(name__in=names).values_list("name", flat=True))
+    return referenced
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete media files that no recipe image or avatar references. "
+        "Files are checked in batches, so memory stays bounded"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-period", type=int, default=24 * 60 * 60,
+            help="Seconds a file must be unmodified before it can be deleted",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Report the orphaned files without deleting them",
+        )
+
+    def handle(self, *args, **options):
+        root = settings.MEDIA_ROOT
+        cutoff = time.time() - options["grace_period"]
+        dry_run = options["dry_run"]
+        self.verbosity = options["verbosity"]
+        self.stats = dict.fromkeys(("scanned", "recent", "orphaned", "deleted", "freed"), 0)
+        started = time.monotonic()
+
+        for model, field_name in MEDIA_FIELDS:
+            directory = model._meta.get_field(field_name).upload_to
+            files = iter_files(root, directory)
+            while batch := list(islice(files, options["batch_size"])):
+                self.collect_batch(root, batch, cutoff, dry_run)
+
+        elapsed = time.monotonic() - started
+        stats = self.stats
+        rate = stats["scanned"] / elapsed if elapsed else stats["scanned"]
+        action = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{action} {stats['orphaned'] if dry_run else stats['deleted']} orphaned files "
+                f"({stats['freed'] / 1024 / 1024:.1f} MB): {stats['scanned']} scanned, "
+                f"{stats['recent']} within the grace period, in {elapsed:.2f}s ({rate:.0f} files/s)"
+            )
+        )
+
+    def collect_batch(self, root, batch, cutoff, dry_run):
+        self.stats["scanned"] += len(batch)
+        candidates = {}
+        for entry in batch:
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > cutoff:
+                self.stats["recent"] += 1
+                continue
+            name = os.path.relpath(entry.path, root).replace(os.sep, posixpath.sep)
+            candidates[name] = (entry.path, stat.st_size)
+        if not candidates:
+            return
+
+        lookup = {name: original_names(name) for name in candidates}
+        referenced = referenced_names([n for names in lookup.values() for n in names])
+        for name, (path, size) in candidates.items():
+            if referenced.intersection(lookup[name]):
+                continue
+            self.stats["orphaned"] += 1
+            if dry_run:
+                self.stats["freed"] += size
+                if self.verbosity > 1:
+                    self.stdout.write(f"Would delete {name}")
+                continue
+            try:
+                # The file may have been reused since it was listed.
+                if os.stat(path).st_mtime > cutoff:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self.stats["deleted"] += 1
+            self.stats["freed"] += size
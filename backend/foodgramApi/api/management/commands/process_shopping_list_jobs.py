@@ -0,0 +1,55 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from api.shopping_list import (
+    claim_shopping_list_job,
+    purge_shopping_list_jobs,
+    requeue_stale_shopping_list_jobs,
+    run_shopping_list_job,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Render queued shopping list PDFs. Several workers can run side by "
+        "side; each claims jobs from the database table with SKIP LOCKED"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Process the jobs that are queued now and exit",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=1.0,
+            help="Seconds to sleep when the queue is empty",
+        )
+        parser.add_argument(
+            "--stale-after", type=int, default=300,
+            help="Seconds after which a running job is considered abandoned",
+        )
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(seconds=options["stale_after"])
+        requeued = requeue_stale_shopping_list_jobs(stale_after)
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} abandoned jobs")
+
+        while True:
+            job = claim_shopping_list_job()
+            if job is None:
+                purge_shopping_list_jobs()
+                if options["once"]:
+                    return
+                time.sleep(options["poll_interval"])
+                requeue_stale_shopping_list_jobs(stale_after)
+                continue
+
+            started = time.monotonic()
+            run_shopping_list_job(job)
+            style = self.style.SUCCESS if job.status == job.Status.DONE else self.style.ERROR
+            self.stdout.write(
+                style(f"Job {job.id}: {job.status} in {time.monotonic() - started:.2f}s")
+            )
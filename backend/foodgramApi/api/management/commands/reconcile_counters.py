@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.counters import COUNTERS, reconcile_counter
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the denormalized favorites, cart, recipes, followers and "
+        "following counters from the relation tables"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=10000,
+            help="Rows updated per statement, in primary key ranges",
+        )
+
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            started = time.monotonic()
+            fixed = reconcile_counter(
+                model, field, related_model, related_field, options["batch_size"]
+            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{model._meta.verbose_name_plural}.{field}: {fixed} rows fixed "
+                    f"in {time.monotonic() - started:.2f}s"
+                )
+            )
@@ -0,0 +1,62 @@
+"""
+Reference counting of content-addressed media files.
+
+``ContentAddressedStorage`` stores identical uploads once, so a file may be
+referenced by several rows. ``MediaBlob`` counts those references; a file and
+its renditions are deleted only when the last reference is released. Names
+that are not content-addressed (legacy uploads, the default avatar) are not
+counted and never deleted here.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from .images import RENDITION_SIZES, rendition_names
+from .models import MediaBlob
+
+CONTENT_ADDRESSED_NAME = re.compile(r"(?:^|/)[0-9a-f]{2}/[0-9a-f]{64}\.\w+$")
+
+
+def is_content_addressed(name):
+    return bool(name) and CONTENT_ADDRESSED_NAME.search(name) is not None
+
+
+def acquire(name):
+    if not is_content_addressed(name):
+        return
+    table = connection.ops.quote_name(MediaBlob._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (name, refcount) VALUES (%s, 1) "
+            f"ON CONFLICT (name) DO UPDATE SET refcount = {table}.refcount + 1",
+            [name],
+        )
+
+
+def release(name, storage):
+    """Drop a reference; the file is deleted after commit if it was the last."""
+    if not is_content_addressed(name):
+        return
+    MediaBlob.objects.filter(name=name).update(refcount=F("refcount") - 1)
+    if MediaBlob.objects.filter(name=name, refcount=0).delete()[0]:
+        transaction.on_commit(lambda: delete_if_unreferenced(name, storage))
+
+
+def delete_if_unreferenced(name, storage):
+    # A concurrent upload of the same content may have referenced it again.
+    if MediaBlob.objects.filter(name=name).exists():
+        return
+    storage.delete(name)
+    for kind in RENDITION_SIZES:
+        for formats in rendition_names(name, kind).values():
+            for rendition_name in formats.values():
+                storage.delete(rendition_name)
+
+
+def discard_file(name, storage):
+    """Remove a file stored by a write that was rolled back."""
+    if is_content_addressed(name):
+        delete_if_unreferenced(name, storage)
+    else:
+        storage.delete(name)
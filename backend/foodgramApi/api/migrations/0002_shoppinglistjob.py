@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:00
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShoppingListJob",
+            fields=[
+                ("id", models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ("status", models.CharField(choices=[("pending", "В очереди"), ("running", "Выполняется"), ("done", "Готово"), ("failed", "Ошибка")], default="pending", max_length=16, verbose_name="Статус")),
+                ("pdf", models.BinaryField(null=True, verbose_name="PDF")),
+                ("error", models.TextField(blank=True, verbose_name="Ошибка")),
+                ("created", models.DateTimeField(auto_now_add=True, verbose_name="Создано")),
+                ("started", models.DateTimeField(blank=True, null=True, verbose_name="Начато")),
+                ("finished", models.DateTimeField(blank=True, null=True, verbose_name="Завершено")),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="shopping_list_jobs", to=settings.AUTH_USER_MODEL, verbose_name="Пользователь")),
+            ],
+            options={
+                "verbose_name": "Задача списка покупок",
+                "verbose_name_plural": "Задачи списка покупок",
+                "ordering": ("created",),
+                "indexes": [models.Index(fields=["status", "created"], name="shopping_list_job_queue_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-18 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0002_shoppinglistjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaBlob",
+            fields=[
+                ("name", models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name="Файл")),
+                ("refcount", models.PositiveIntegerField(default=0, verbose_name="Число ссылок")),
+            ],
+            options={
+                "verbose_name": "Медиафайл",
+                "verbose_name_plural": "Медиафайлы",
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ("recipes", "Recipe", "favorites_count", "api", "Favorite", "recipe"),
+    ("recipes", "Recipe", "in_carts_count", "api", "ShoppingCart", "recipe"),
+    ("users", "User", "recipes_count", "recipes", "Recipe", "author"),
+    ("users", "User", "followers_count", "api", "Subscription", "author"),
+    ("users", "User", "following_count", "api", "Subscription", "user"),
+)
+
+
+def backfill_counters(apps, schema_editor):
+    for app_label, model_name, field, related_app, related_name, related_field in COUNTERS:
+        related_model = apps.get_model(related_app, related_name)
+        counts = (
+            related_model.objects.filter(**{related_field: OuterRef("pk")})
+            .order_by()
+            .values(related_field)
+            .annotate(total=Count("*"))
+            .values("total")
+        )
+        apps.get_model(app_label, model_name).objects.update(
+            **{field: Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_mediablob"),
+        ("recipes", "0009_recipe_counters"),
+        ("users", "0007_user_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.conf import settings
 from recipes.models import Recipe
@@ -77,3 +79,53 @@ class Subscription(models.Model):
 
     def __str__(self):
         return f'{self.user} follows {self.author}'
+
+
+class ShoppingListJob(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Готово'
+        FAILED = 'failed', 'Ошибка'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_jobs',
+        verbose_name='Пользователь'
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=16,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    pdf = models.BinaryField('PDF', null=True, editable=False)
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    started = models.DateTimeField('Начато', null=True, blank=True)
+    finished = models.DateTimeField('Завершено', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Задача списка покупок'
+        verbose_name_plural = 'Задачи списка покупок'
+        ordering = ('created',)
+        indexes = [
+            models.Index(fields=['status', 'created'], name='shopping_list_job_queue_idx')
+        ]
+
+    def __str__(self):
+        return f'{self.user} shopping list {self.status}'
+
+
+class MediaBlob(models.Model):
+    name = models.CharField('Файл', max_length=255, primary_key=True)
+    refcount = models.PositiveIntegerField('Число ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
@@ -0,0 +1,105 @@
+"""
+``EXPLAIN`` checks of the queries behind the busiest endpoints.
+
+Index problems only show at scale, so the checks are meant to run against a
+dataset from ``generate_dataset`` on PostgreSQL. A plan fails when it reads
+a large table with a sequential scan or its estimated cost is over budget.
+"""
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count
+from django.http import HttpRequest, QueryDict
+
+from ingredients.models import Ingredient
+from .models import Favorite, Subscription
+from .relations import RELATIONS
+from .shopping_list import get_shopping_list_ingredients
+
+User = get_user_model()
+
+PAGE_SIZE = 6
+
+
+def _filtered_recipes(user, params):
+    from .views.recipes import RecipeFilter, RecipeViewSet
+
+    request = HttpRequest()
+    request.user = user
+    return RecipeFilter(
+        QueryDict(params), queryset=RecipeViewSet.queryset.all(), request=request
+    ).qs
+
+
+def hot_queries(user):
+    """
+    ``{name: queryset}`` of the hot queries as ``user`` would run them.
+    Pick a user with favorites, a cart and subscriptions for realistic plans.
+    """
+    from .views.users import UserActionsViewSet
+
+    ingredient_ids = Ingredient.objects.order_by("pk").values_list("pk", flat=True)[:2]
+    authors = User.objects.filter(followers__user=user).order_by("username")[:PAGE_SIZE]
+    queries = {
+        "recipe_feed": _filtered_recipes(user, "")[:PAGE_SIZE],
+        "author_recipes": _filtered_recipes(user, f"author={user.pk}")[:PAGE_SIZE],
+        "favorited": _filtered_recipes(user, "is_favorited=1")[:PAGE_SIZE],
+        "not_favorited": _filtered_recipes(user, "is_favorited=0")[:PAGE_SIZE],
+        "in_shopping_cart": _filtered_recipes(user, "is_in_shopping_cart=1")[:PAGE_SIZE],
+        "ingredients_all": _filtered_recipes(
+            user, "ingredients=" + ",".join(map(str, ingredient_ids))
+        )[:PAGE_SIZE],
+        "search": _filtered_recipes(user, "search=суп")[:PAGE_SIZE],
+        "shopping_list": get_shopping_list_ingredients(user),
+        "subscriptions": authors,
+        "subscription_recipes": UserActionsViewSet.page_recipes_queryset(authors, 3),
+        "followers": Subscription.objects.filter(author=user).values_list("user_id", flat=True),
+    }
+    for name, (model, field) in RELATIONS.items():
+        queries[f"{name}_ids"] = model.objects.filter(user_id=user.pk).values_list(field, flat=True)
+    return queries
+
+
+def pick_user():
+    """The user with the most favorites, the worst case for most plans."""
+    busiest = (
+        Favorite.objects.values("user_id").annotate(total=Count("*")).order_by("-total").first()
+    )
+    if busiest is None:
+        return User.objects.order_by("pk").first()
+    return User.objects.get(pk=busiest["user_id"])
+
+
+def explain(queryset):
+    """Root node of the ``EXPLAIN (FORMAT JSON)`` plan of ``queryset``."""
+    return json.loads(queryset.explain(format="json"))[0]["Plan"]
+
+
+def iter_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from iter_nodes(child)
+
+
+def get_large_tables(threshold):
+    """Tables of the public schema the planner estimates at ``threshold`` rows or more."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname FROM pg_class "
+            "WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace AND reltuples >= %s",
+            [threshold],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def check_plan(plan, large_tables, max_cost):
+    """Problems found in ``plan``, as human-readable strings."""
+    problems = [
+        f"sequential scan on {node['Relation Name']}"
+        for node in iter_nodes(plan)
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in large_tables
+    ]
+    if plan["Total Cost"] > max_cost:
+        problems.append(f"total cost {plan['Total Cost']:.0f} is over {max_cost:.0f}")
+    return problems
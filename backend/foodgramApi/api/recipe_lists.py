@@ -0,0 +1,106 @@
+"""
+Batch changes to a user's favorites or shopping cart.
+
+A batch is one validated set operation: the current rows are read once, the
+missing ones are added with a single ``bulk_create`` and the extra ones are
+dropped with a single filtered delete. Neither goes through the model
+signals, so the recipe counters, the cached relation sets and the cart
+version are updated here once per batch.
+"""
+from django.db import transaction
+
+from recipes.models import Recipe
+from .counters import RECIPE_COUNTERS, adjust_counter
+from .models import ShoppingCart
+from .relations import invalidate_relations
+from .shopping_list import invalidate_cart_versions
+
+ADD = "add"
+REMOVE = "remove"
+REPLACE = "replace"
+
+# Per-id outcomes.
+ADDED = "added"
+REMOVED = "removed"
+PRESENT = "present"
+ABSENT = "absent"
+NOT_FOUND = "not_found"
+
+
+def insert_recipes(model, user_id, recipe_ids):
+    """Add the rows of ``recipe_ids`` the user does not have yet and return their ids."""
+    if not recipe_ids:
+        return set()
+    current = set(
+        model.objects.filter(user_id=user_id, recipe_id__in=recipe_ids)
+        .values_list("recipe_id", flat=True)
+    )
+    added = [pk for pk in recipe_ids if pk not in current]
+    model.objects.bulk_create(
+        [model(user_id=user_id, recipe_id=pk) for pk in added], ignore_conflicts=True
+    )
+    return set(added)
+
+
+def delete_recipes(model, user_id, recipe_ids, keep=False):
+    """
+    Delete the rows of ``recipe_ids`` (or, with ``keep``, every other row of
+    the user) and return the recipe ids that were deleted.
+    """
+    entries = model.objects.filter(user_id=user_id)
+    if keep:
+        entries = entries.exclude(recipe_id__in=recipe_ids)
+    elif recipe_ids:
+        entries = entries.filter(recipe_id__in=recipe_ids)
+    else:
+        return set()
+    # The lock keeps a concurrent batch from counting the same rows as removed.
+    removed = dict(entries.select_for_update().values_list("pk", "recipe_id"))
+    if removed:
+        # QuerySet.delete() would send post_delete, and adjust the counters, per row.
+        rows = model.objects.filter(pk__in=removed)
+        rows._raw_delete(rows.db)
+    return set(removed.values())
+
+
+def change_recipe_list(model, user, recipe_ids, mode):
+    """
+    Add, remove or replace the recipes of ``user`` in ``model`` (``Favorite``
+    or ``ShoppingCart``) and return ``[{"id": ..., "status": ...}]`` for every
+    requested id, followed by the ids a replace removed.
+    """
+    requested = list(dict.fromkeys(recipe_ids))
+    with transaction.atomic():
+        found = set(Recipe.objects.filter(pk__in=requested).values_list("pk", flat=True))
+        existing = [pk for pk in requested if pk in found]
+        added = removed = set()
+        if mode in (ADD, REPLACE):
+            added = insert_recipes(model, user.pk, existing)
+        if mode == REMOVE:
+            removed = delete_recipes(model, user.pk, existing)
+        elif mode == REPLACE:
+            removed = delete_recipes(model, user.pk, existing, keep=True)
+
+        counter = RECIPE_COUNTERS[model]
+        if added:
+            adjust_counter(Recipe, added, counter, 1)
+        if removed:
+            adjust_counter(Recipe, removed, counter, -1)
+        if added or removed:
+            invalidate_relations([user.pk])
+            if model is ShoppingCart:
+                invalidate_cart_versions([user.pk])
+
+    outcomes = []
+    for pk in requested:
+        if pk not in found:
+            status = NOT_FOUND
+        elif pk in added:
+            status = ADDED
+        elif pk in removed:
+            status = REMOVED
+        else:
+            status = ABSENT if mode == REMOVE else PRESENT
+        outcomes.append({"id": pk, "status": status})
+    outcomes.extend({"id": pk, "status": REMOVED} for pk in sorted(removed.difference(requested)))
+    return outcomes
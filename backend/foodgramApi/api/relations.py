@@ -0,0 +1,74 @@
+"""
+Per-user sets of related ids: favorite recipes, recipes in the shopping cart
+and followed authors.
+
+The sets are loaded lazily into the cache under a per-user version token,
+the same scheme the shopping cart PDFs use. Signals drop the token once a
+transaction that changes a relation commits, so readers never see a set that
+is older than the last committed write. Within a request the sets are memoized
+on the request, so serializing a page reads the cache at most once per set.
+"""
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+
+from foodgramApi.cache_versions import get_version, invalidate_versions
+from .models import Favorite, ShoppingCart, Subscription
+
+FAVORITES = "favorites"
+CART = "cart"
+FOLLOWING = "following"
+RELATIONS = {
+    FAVORITES: (Favorite, "recipe_id"),
+    CART: (ShoppingCart, "recipe_id"),
+    FOLLOWING: (Subscription, "author_id"),
+}
+RELATIONS_VERSION_KEY = "relations:version:{user_id}"
+RELATION_IDS_KEY = "relations:{name}:{user_id}:{version}"
+RELATION_IDS_TIMEOUT = 60 * 60 * 24
+
+
+def get_relations_version(user_id):
+    return get_version(RELATIONS_VERSION_KEY.format(user_id=user_id))
+
+
+def get_relation_ids(user_id, name):
+    key = RELATION_IDS_KEY.format(name=name, user_id=user_id, version=get_relations_version(user_id))
+    ids = cache.get(key)
+    if ids is None:
+        model, field = RELATIONS[name]
+        ids = frozenset(model.objects.filter(user_id=user_id).values_list(field, flat=True))
+        cache.set(key, ids, RELATION_IDS_TIMEOUT)
+    return ids
+
+
+def invalidate_relations(user_ids):
+    """Drop the cached sets of the users once the transaction commits."""
+    invalidate_versions(RELATIONS_VERSION_KEY.format(user_id=user_id) for user_id in user_ids)
+
+
+class UserRelations:
+    """Lazily loaded relation sets of one user."""
+
+    def __init__(self, user):
+        self.user = user
+        self._ids = {}
+
+    def ids(self, name):
+        if name not in self._ids:
+            if self.user.is_authenticated:
+                self._ids[name] = get_relation_ids(self.user.pk, name)
+            else:
+                self._ids[name] = frozenset()
+        return self._ids[name]
+
+    def has(self, name, pk):
+        return pk in self.ids(name)
+
+
+def get_user_relations(request):
+    """Relation sets of ``request.user``, memoized for the request."""
+    relations = getattr(request, "_user_relations", None)
+    if relations is None:
+        relations = UserRelations(getattr(request, "user", None) or AnonymousUser())
+        request._user_relations = relations
+    return relations
@@ -0,0 +1,64 @@
+"""
+Renderers for the shopping list formats.
+"""
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Selects a shopping list format through ``?format=`` or ``Accept``.
+
+    The action builds the file response itself; only error payloads
+    (authentication, permission) go through ``render`` and are sent as JSON.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        response = (renderer_context or {}).get("response")
+        if response is not None:
+            response["Content-Type"] = JSONRenderer.media_type
+        return JSONRenderer().render(data)
+
+
+class PDFRenderer(ShoppingListRenderer):
+    media_type = "application/pdf"
+    format = "pdf"
+    charset = None
+    render_style = "binary"
+
+
+class PlainTextRenderer(ShoppingListRenderer):
+    media_type = "text/plain"
+    format = "txt"
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class ShoppingListNegotiation(DefaultContentNegotiation):
+    """
+    Serves the first renderer (the PDF) unless ``?format=`` asks otherwise or
+    ``Accept`` lists only text formats. Generic headers such as
+    ``application/json, text/plain, */*`` keep getting the PDF.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        if format_suffix or request.query_params.get(self.settings.URL_FORMAT_OVERRIDE):
+            return super().select_renderer(request, renderers, format_suffix)
+        accepted = [
+            media_range.split(";")[0].strip().lower()
+            for media_range in request.META.get("HTTP_ACCEPT", "").split(",")
+            if media_range.strip()
+        ]
+        text_renderers = {
+            renderer.media_type: renderer for renderer in renderers[1:]
+        }
+        if accepted and all(media_type in text_renderers for media_type in accepted):
+            renderer = text_renderers[accepted[0]]
+        else:
+            renderer = renderers[0]
+        return renderer, renderer.media_type
@@ -0,0 +1,154 @@
+import base64
+import binascii
+import hashlib
+import posixpath
+import warnings
+from contextlib import contextmanager
+from uuid import uuid4
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
+from PIL import Image
+from rest_framework import serializers
+
+from ..images import get_rendition_names
+from ..media import discard_file, is_content_addressed
+
+MAX_IMAGE_SIZE = 5 * 1024 * 1024
+MAX_IMAGE_PIXELS = 25_000_000
+ALLOWED_IMAGE_FORMATS = {"JPEG", "PNG", "GIF", "WEBP"}
+
+
+class Base64ImageField(serializers.ImageField):
+    """
+    Image sent either as a ``data:image/<ext>;base64,...`` string or as a
+    ``multipart/form-data`` file.
+
+    The byte size and the image header (format and pixel dimensions) are
+    checked before the image is fully read. Base64 payloads are decoded once
+    here and the resulting file is carried in ``validated_data``, so
+    ``create``/``update`` only have to assign it.
+
+    On updates, the URL of the current image or a payload with the same
+    content keeps the current file as is, without decoding or saving it.
+    """
+
+    default_error_messages = {
+        "invalid_format": "Invalid image format",
+        "invalid_image": "Invalid image data",
+        "too_large": "Image size should not exceed 5MB",
+        "too_many_pixels": "Image dimensions are too large",
+    }
+
+    def to_internal_value(self, data):
+        current = self.get_current_file()
+        if isinstance(data, UploadedFile):
+            if data.size > MAX_IMAGE_SIZE:
+                self.fail("too_large")
+            if self.has_content_of(current, data):
+                return current
+            self.check_header(data)
+            return super().to_internal_value(data)
+        if current and isinstance(data, str) and data.endswith(current.url):
+            return current
+        if not isinstance(data, str) or not data.startswith("data:image/"):
+            self.fail("invalid_format")
+        try:
+            header, encoded = data.split(";base64,")
+        except ValueError:
+            self.fail("invalid_image")
+        # Reject oversized payloads before decoding them.
+        if len(encoded) * 3 // 4 > MAX_IMAGE_SIZE + 2:
+            self.fail("too_large")
+        try:
+            decoded = base64.b64decode(encoded)
+        except (binascii.Error, ValueError):
+            self.fail("invalid_image")
+        if len(decoded) > MAX_IMAGE_SIZE:
+            self.fail("too_large")
+
+        ext = header.split("/")[-1]
+        file = ContentFile(decoded, name=f"{uuid4().hex}.{ext}")
+        if self.has_content_of(current, file):
+            return current
+        self.check_header(file)
+        return super().to_internal_value(file)
+
+    def get_current_file(self):
+        instance = getattr(self.parent, "instance", None)
+        if instance is None or isinstance(instance, (list, tuple)):
+            return None
+        return getattr(instance, self.source, None) or None
+
+    @staticmethod
+    def has_content_of(current, file):
+        """Whether ``file`` holds the bytes of the content-addressed ``current`` file."""
+        if not current or not is_content_addressed(current.name):
+            return False
+        digest = hashlib.sha256()
+        for chunk in file.chunks():
+            digest.update(chunk)
+        file.seek(0)
+        return posixpath.splitext(posixpath.basename(current.name))[0] == digest.hexdigest()
+
+    def check_header(self, file):
+        """Validate format and dimensions; Pillow reads only the header here."""
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", Image.DecompressionBombWarning)
+                with Image.open(file) as image:
+                    image_format, (width, height) = image.format, image.size
+        except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+            self.fail("too_many_pixels")
+        except (OSError, SyntaxError, ValueError):
+            self.fail("invalid_image")
+        finally:
+            file.seek(0)
+        if image_format not in ALLOWED_IMAGE_FORMATS:
+            self.fail("invalid_format")
+        if width * height > MAX_IMAGE_PIXELS:
+            self.fail("too_many_pixels")
+
+
+@extend_schema_field(OpenApiTypes.OBJECT)
+class ImageRenditionsField(serializers.Field):
+    """
+    URLs of the resized renditions of an image, ``{size: {format: url}}``.
+    """
+
+    def __init__(self, kind, **kwargs):
+        self.kind = kind
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, field_file):
+        names = get_rendition_names(field_file, self.kind)
+        if names is None:
+            return None
+        request = self.context.get("request")
+        storage = field_file.storage
+        return {
+            size: {
+                fmt: request.build_absolute_uri(storage.url(name)) if request else storage.url(name)
+                for fmt, name in formats.items()
+            }
+            for size, formats in names.items()
+        }
+
+
+@contextmanager
+def delete_file_on_error(instance, field_name):
+    """
+    Remove the file stored for ``instance.<field_name>`` inside the enclosed
+    block (the transaction that writes the row) when that block fails.
+    """
+    name_before = getattr(instance, field_name).name
+    try:
+        yield
+    except Exception:
+        field_file = getattr(instance, field_name)
+        if field_file and field_file._committed and field_file.name != name_before:
+            discard_file(field_file.name, field_file.storage)
+        raise
@@ -1,14 +1,18 @@
+import json
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from recipes.models import Recipe, RecipeIngredient, Ingredient
+from .fields import Base64ImageField, ImageRenditionsField, delete_file_on_error
 from .users import FoodgramUserSerializer
-import base64
-from django.core.files.base import ContentFile
 from django.db import transaction
-from ..models import Favorite, ShoppingCart
+from ..relations import CART, FAVORITES, get_user_relations
+from ..shopping_list import invalidate_recipe_carts
 
 User = get_user_model()
 
+MAX_BATCH_RECIPES = 100
+
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source="ingredient.id")
@@ -25,6 +29,7 @@ class RecipeListSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientSerializer(many=True, source='recipe_ingredients.all')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_renditions = ImageRenditionsField("recipe", source="image")
 
     class Meta:
         model = Recipe
@@ -36,25 +41,24 @@ class RecipeListSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_renditions",
             "text",
             "cooking_time",
         )
         read_only_fields = fields
-        
+
     def get_is_favorited(self, recipe):
-        request = self.context.get("request") 
-        return bool(
-            request
-            and hasattr(request, 'user')
-            and request.user.is_authenticated
-            and Favorite.objects.filter(user=request.user, recipe=recipe).exists()
-        )
+        return self._get_user_flag(recipe, "is_favorited", FAVORITES)
 
     def get_is_in_shopping_cart(self, recipe):
+        return self._get_user_flag(recipe, "is_in_shopping_cart", CART)
+
+    def _get_user_flag(self, recipe, name, relation):
+        known = getattr(recipe, name, None)
+        if known is not None:
+            return bool(known)
         request = self.context.get("request")
-        if request and hasattr(request, 'user') and request.user.is_authenticated:
-            return ShoppingCart.objects.filter(user=request.user, recipe=recipe).exists()
-        return False
+        return bool(request and get_user_relations(request).has(relation, recipe.pk))
 
 
 class IngredientInRecipeSerializer(serializers.Serializer):
@@ -64,13 +68,27 @@ class IngredientInRecipeSerializer(serializers.Serializer):
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     ingredients = IngredientInRecipeSerializer(many=True, required=True)
-    image = serializers.CharField(required=True)
+    image = Base64ImageField(required=True)
     cooking_time = serializers.IntegerField(min_value=1)
 
     class Meta:
         model = Recipe
         fields = ("ingredients", "image", "name", "text", "cooking_time")
 
+    def to_internal_value(self, data):
+        # Multipart requests carry the ingredients list as a JSON string
+        # next to the image file.
+        if hasattr(data, "getlist"):
+            data = data.dict()
+            if isinstance(data.get("ingredients"), str):
+                try:
+                    data["ingredients"] = json.loads(data["ingredients"])
+                except ValueError:
+                    raise serializers.ValidationError(
+                        {"ingredients": ["Ingredients must be a JSON list."]}
+                    )
+        return super().to_internal_value(data)
+
     def validate_ingredients(self, ingredients_data):
         if not ingredients_data:
             raise serializers.ValidationError("Ingredients list cannot be empty.")
@@ -86,37 +104,18 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({"ingredients": "This field is required"})
         return data
 
-    def validate_image(self, value):
-        try:
-            if not value.startswith("data:image/"):
-                raise serializers.ValidationError("Invalid image format")
-
-            format, imgstr = value.split(";base64,")
-
-            data = base64.b64decode(imgstr)
-
-            if len(data) > 5 * 1024 * 1024:
-                raise serializers.ValidationError("Image size should not exceed 5MB")
-
-            return value
-        except Exception:
-            raise serializers.ValidationError("Invalid image data")
-
     def create(self, validated_data):
         ingredients_data = validated_data.pop("ingredients")
-        image_data = validated_data.pop("image")
 
         validated_data["author"] = self.context["request"].user
-        recipe = super().create(validated_data)
-
-        format, imgstr = image_data.split(";base64,")
-        ext = format.split("/")[-1]
-        filename = f"recipe_{recipe.id}.{ext}"
-        data = ContentFile(base64.b64decode(imgstr), name=filename)
-        recipe.image.save(filename, data, save=True)
-
-        self._bulk_create_recipe_ingredients(recipe, ingredients_data)
-
+        recipe = Recipe(**validated_data)
+        with delete_file_on_error(recipe, "image"), transaction.atomic():
+            recipe.save()
+            self._bulk_create_recipe_ingredients(recipe, ingredients_data)
+
+        # A recipe that has just been created cannot be in anyone's lists yet.
+        recipe.is_favorited = False
+        recipe.is_in_shopping_cart = False
         return recipe
 
     def _bulk_create_recipe_ingredients(self, recipe, ingredients_data):
@@ -133,28 +132,55 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop("ingredients", None)
 
-        if ingredients_data is not None:
-            instance.recipe_ingredients.all().delete()
-            self._bulk_create_recipe_ingredients(instance, ingredients_data)
-
-        image_base64_data = validated_data.pop("image", None)
-
-        if image_base64_data:
-            format_str, imgstr = image_base64_data.split(";base64,")
-            ext = format_str.split("/")[-1]
-            filename = f"recipe_{instance.id}.{ext}"
-            decoded_image_data = ContentFile(base64.b64decode(imgstr), name=filename)
-            instance.image.save(filename, decoded_image_data, save=True)
-
-        return super().update(instance, validated_data)
-
+        with delete_file_on_error(instance, "image"), transaction.atomic():
+            if ingredients_data is not None and self._sync_recipe_ingredients(instance, ingredients_data):
+                invalidate_recipe_carts(instance)
+            return super().update(instance, validated_data)
+
+    def _sync_recipe_ingredients(self, recipe, ingredients_data):
+        """
+        Write only the difference between the stored ingredient rows and
+        ``ingredients_data``; return whether anything changed.
+        """
+        amounts = {item["id"].pk: item["amount"] for item in ingredients_data}
+        existing = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipe_ingredients.all()
+        }
+        removed = [
+            recipe_ingredient.pk
+            for ingredient_id, recipe_ingredient in existing.items()
+            if ingredient_id not in amounts
+        ]
+        changed = []
+        for ingredient_id, recipe_ingredient in existing.items():
+            if ingredient_id in amounts and recipe_ingredient.amount != amounts[ingredient_id]:
+                recipe_ingredient.amount = amounts[ingredient_id]
+                changed.append(recipe_ingredient)
+        added = [item for item in ingredients_data if item["id"].pk not in existing]
+
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ["amount"])
+        if added:
+            self._bulk_create_recipe_ingredients(recipe, added)
+        return bool(removed or changed or added)
 
     def to_representation(self, instance):
         return RecipeListSerializer(instance, context=self.context).data
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField("recipe", source="image")
+
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "image_renditions", "cooking_time")
         read_only_fields = fields
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), max_length=MAX_BATCH_RECIPES
+    )
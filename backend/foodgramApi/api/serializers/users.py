@@ -1,10 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from djoser.serializers import UserSerializer as BaseUserSerializer
-import base64
-from django.core.files.base import ContentFile
 from recipes.models import Recipe
-from ..models import Subscription
+from .fields import Base64ImageField, ImageRenditionsField, delete_file_on_error
+from ..relations import FOLLOWING, get_user_relations
 
 
 User = get_user_model()
@@ -12,6 +11,7 @@ User = get_user_model()
 
 class FoodgramUserSerializer(BaseUserSerializer):
     is_subscribed = serializers.SerializerMethodField()
+    avatar_renditions = ImageRenditionsField("avatar", source="avatar")
 
     class Meta(BaseUserSerializer.Meta):
         model = User
@@ -23,64 +23,61 @@ class FoodgramUserSerializer(BaseUserSerializer):
             'last_name',
             'is_subscribed',
             'avatar',
+            'avatar_renditions',
         )
         read_only_fields = fields
 
     def get_is_subscribed(self, author):
-        request = self.context.get('request') 
+        # UserActionsViewSet.subscriptions knows the answer for the whole page.
+        known = getattr(author, 'is_subscribed', None)
+        if known is not None:
+            return bool(known)
+        request = self.context.get('request')
         return bool(
             request
-            and hasattr(request, 'user')
-            and request.user.is_authenticated
-            and Subscription.objects.filter(user=request.user, author=author).exists()
+            and request.user.pk != author.pk
+            and get_user_relations(request).has(FOLLOWING, author.pk)
         )
 
 
+def get_recipes_limit(request):
+    """Value of the ``recipes_limit`` query parameter, ``None`` if unlimited."""
+    try:
+        recipes_limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return recipes_limit if recipes_limit >= 0 else None
+
+
 class UserWithRecipesSerializer(FoodgramUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(source='recipes.count', read_only=True)
 
     class Meta(FoodgramUserSerializer.Meta):
         fields = FoodgramUserSerializer.Meta.fields + ('recipes', 'recipes_count',)
+        read_only_fields = fields
 
     def get_recipes(self, obj):
         from .recipes import ShortRecipeSerializer
         request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        if recipes_limit:
-            try:
-                recipes_limit = int(recipes_limit)
-            except (TypeError, ValueError):
-                recipes_limit = 10**10
-        else:
-            recipes_limit = 10**10
-
-        recipes = obj.recipes.all()[:recipes_limit]
-        return ShortRecipeSerializer(recipes, many=True, context={'request': request}).data 
-    
-class UserAvatarSerializer(serializers.ModelSerializer): 
-    avatar = serializers.CharField(required=True) 
-    class Meta: 
-        model = User 
-        fields = ("avatar",)  
-
-    def validate_avatar(self, value): 
-        try: 
-            if not value.startswith("data:image/"): 
-                raise serializers.ValidationError("Invalid image format") 
-            format, imgstr = value.split(";base64,") 
-            data = base64.b64decode(imgstr) 
-            if len(data) > 5 * 1024 * 1024: 
-                raise serializers.ValidationError("Image size should not exceed 5MB") 
-            return value 
-        except Exception: 
-            raise serializers.ValidationError("Invalid image data") 
-
-    def update(self, instance, validated_data): 
-        format, imgstr = validated_data["avatar"].split(";base64,") 
-        ext = format.split("/")[-1] 
-        filename = f"avatar_{instance.id}.{ext}" 
-        data = ContentFile(base64.b64decode(imgstr), name=filename) 
-        instance.avatar.save(filename, data, save=True) 
+        # UserActionsViewSet.subscriptions loads the recipes for the whole page.
+        recipes = getattr(obj, 'page_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()
+            recipes_limit = get_recipes_limit(request)
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
+        return ShortRecipeSerializer(recipes, many=True, context={'request': request}).data
+
+
+class UserAvatarSerializer(serializers.ModelSerializer):
+    avatar = Base64ImageField(required=True)
+
+    class Meta:
+        model = User
+        fields = ("avatar",)
+
+    def update(self, instance, validated_data):
+        instance.avatar = validated_data["avatar"]
+        with delete_file_on_error(instance, "avatar"):
+            instance.save(update_fields=["avatar"])
         return instance
-    
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""
+Building and rendering of the shopping list.
+
+Rendered PDFs are cached per user under a cart version. The version is an
+opaque token that is dropped whenever the cart contents change, so a stale
+PDF is never served and repeat downloads skip both the query and the render.
+"""
+import csv
+import logging
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from foodgramApi.cache_versions import get_version, invalidate_versions
+from recipes.models import RecipeIngredient
+from .models import ShoppingCart, ShoppingListJob
+
+CART_VERSION_KEY = "shopping_cart:version:{user_id}"
+CART_PDF_KEY = "shopping_cart:pdf:{user_id}:{version}"
+CART_PDF_TIMEOUT = 60 * 60 * 24
+ITERATOR_CHUNK_SIZE = 500
+JOB_RETENTION = timedelta(days=1)
+JOB_ERROR_MESSAGE = "Не удалось сформировать список покупок."
+
+logger = logging.getLogger(__name__)
+
+
+class Echo:
+    """File-like object whose ``write`` returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def get_shopping_list_ingredients(user):
+    recipe_ids = ShoppingCart.objects.filter(user=user).values_list('recipe_id', flat=True)
+    return (
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        .values("ingredient__name", "ingredient__measurement_unit")
+        .annotate(total_amount=Sum("amount"))
+        .order_by("ingredient__name")
+    )
+
+
+def render_shopping_list_pdf(ingredients):
+    # WeasyPrint pulls in Pango/Cairo; import it only when a PDF is rendered.
+    from weasyprint import HTML
+
+    html = render_to_string("shopping_list.html", {"ingredients": ingredients})
+    return HTML(string=html, encoding="utf-8").write_pdf()
+
+
+def iter_shopping_list_txt(user):
+    yield "Список покупок\n\n"
+    for item in get_shopping_list_ingredients(user).iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        yield (
+            f"{item['ingredient__name']} ({item['ingredient__measurement_unit']})"
+            f" — {item['total_amount']}\n"
+        )
+
+
+def iter_shopping_list_csv(user):
+    writer = csv.writer(Echo())
+    yield writer.writerow(["ingredient", "measurement_unit", "amount"])
+    for item in get_shopping_list_ingredients(user).iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        yield writer.writerow([
+            item["ingredient__name"],
+            item["ingredient__measurement_unit"],
+            item["total_amount"],
+        ])
+
+
+def get_cart_version(user_id):
+    return get_version(CART_VERSION_KEY.format(user_id=user_id))
+
+
+def invalidate_cart_versions(user_ids):
+    """Drop the cart versions of the users once the transaction commits."""
+    invalidate_versions(CART_VERSION_KEY.format(user_id=user_id) for user_id in user_ids)
+
+
+def invalidate_recipe_carts(recipe):
+    """Drop the cart versions of every user who has the recipe in the cart."""
+    invalidate_cart_versions(
+        ShoppingCart.objects.filter(recipe=recipe).values_list("user_id", flat=True)
+    )
+
+
+def get_shopping_list_pdf(user):
+    key = CART_PDF_KEY.format(user_id=user.pk, version=get_cart_version(user.pk))
+    pdf = cache.get(key)
+    if pdf is None:
+        pdf = render_shopping_list_pdf(get_shopping_list_ingredients(user))
+        cache.set(key, pdf, CART_PDF_TIMEOUT)
+    return pdf
+
+
+def enqueue_shopping_list_job(user):
+    """Queue a PDF render, reusing a job of the user that is still queued."""
+    job = ShoppingListJob.objects.filter(
+        user=user, status=ShoppingListJob.Status.PENDING
+    ).first()
+    return job or ShoppingListJob.objects.create(user=user)
+
+
+def claim_shopping_list_job():
+    """Mark the oldest queued job as running; concurrent workers skip it."""
+    with transaction.atomic():
+        job = (
+            ShoppingListJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ShoppingListJob.Status.PENDING)
+            .select_related("user")
+            .order_by("created")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ShoppingListJob.Status.RUNNING
+        job.started = timezone.now()
+        job.save(update_fields=["status", "started"])
+    return job
+
+
+def run_shopping_list_job(job):
+    # Workers render from the database rather than the version-keyed PDF
+    # cache: their cache need not be the one the web process invalidates.
+    try:
+        job.pdf = render_shopping_list_pdf(get_shopping_list_ingredients(job.user))
+        job.status = ShoppingListJob.Status.DONE
+    except Exception:
+        logger.exception("Shopping list job %s failed", job.pk)
+        job.status = ShoppingListJob.Status.FAILED
+        job.error = JOB_ERROR_MESSAGE
+    job.finished = timezone.now()
+    job.save(update_fields=["pdf", "status", "error", "finished"])
+    return job
+
+
+def requeue_stale_shopping_list_jobs(stale_after):
+    """Return jobs of crashed workers to the queue."""
+    return ShoppingListJob.objects.filter(
+        status=ShoppingListJob.Status.RUNNING,
+        started__lt=timezone.now() - stale_after,
+    ).update(status=ShoppingListJob.Status.PENDING, started=None)
+
+
+def purge_shopping_list_jobs():
+    return ShoppingListJob.objects.filter(
+        status__in=[ShoppingListJob.Status.DONE, ShoppingListJob.Status.FAILED],
+        finished__lt=timezone.now() - JOB_RETENTION,
+    ).delete()[0]
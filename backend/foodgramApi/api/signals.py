@@ -0,0 +1,119 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from recipes.models import Recipe
+from .counters import RECIPE_COUNTERS, adjust_counter, adjust_follow_counters
+from .images import get_rendition_names
+from .media import acquire, release
+from .models import Favorite, ShoppingCart, Subscription
+from .relations import invalidate_relations
+from .shopping_list import invalidate_cart_versions
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    invalidate_cart_versions([instance.user_id])
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def relation_changed(sender, instance, **kwargs):
+    invalidate_relations([instance.user_id])
+
+
+def remember_media_name(instance, field_name):
+    # Deferred fields are not in __dict__; reading them would run a query.
+    if field_name in instance.__dict__:
+        value = instance.__dict__[field_name]
+        instance._loaded_media_name = getattr(value, "name", value) or None
+
+
+def media_saved(instance, field_name, kind, created, update_fields):
+    if update_fields is not None and field_name not in update_fields:
+        return
+    field_file = getattr(instance, field_name)
+    name = field_file.name or None
+    loaded_name = None if created else getattr(instance, "_loaded_media_name", None)
+    if name == loaded_name:
+        return
+    acquire(name)
+    release(loaded_name, field_file.storage)
+    instance._loaded_media_name = name
+    if field_file:
+        transaction.on_commit(lambda: get_rendition_names(field_file, kind, use_cache=False))
+
+
+def media_deleted(instance, field_name):
+    field_file = getattr(instance, field_name)
+    release(getattr(instance, "_loaded_media_name", field_file.name), field_file.storage)
+
+
+@receiver(post_init, sender=Recipe)
+def recipe_initialized(sender, instance, **kwargs):
+    remember_media_name(instance, "image")
+    instance._loaded_author_id = instance.__dict__.get("author_id")
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, update_fields=None, **kwargs):
+    media_saved(instance, "image", "recipe", created, update_fields)
+    if created:
+        adjust_counter(User, [instance.author_id], "recipes_count", 1)
+    elif instance._loaded_author_id not in (None, instance.author_id):
+        adjust_counter(User, [instance._loaded_author_id], "recipes_count", -1)
+        adjust_counter(User, [instance.author_id], "recipes_count", 1)
+    instance._loaded_author_id = instance.author_id
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    media_deleted(instance, "image")
+    adjust_counter(User, [instance.author_id], "recipes_count", -1)
+
+
+@receiver(post_init, sender=User)
+def user_initialized(sender, instance, **kwargs):
+    remember_media_name(instance, "avatar")
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    media_saved(instance, "avatar", "avatar", created, update_fields)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    media_deleted(instance, "avatar")
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def recipe_relation_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_counter(Recipe, [instance.recipe_id], RECIPE_COUNTERS[sender], 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def recipe_relation_deleted(sender, instance, **kwargs):
+    adjust_counter(Recipe, [instance.recipe_id], RECIPE_COUNTERS[sender], -1)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_follow_counters(instance.user_id, instance.author_id, 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    adjust_follow_counters(instance.user_id, instance.author_id, -1)
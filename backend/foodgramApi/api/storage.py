@@ -0,0 +1,88 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names files by the SHA-256 of their content.
+
+    Files are stored as ``<upload dir>/<xx>/<sha256><ext>``, so a name always
+    refers to the same bytes. Saving content that is already stored returns
+    the existing name without writing anything. Files are written to a
+    temporary file and renamed into place, so concurrent saves of the same
+    content both end up with the hashed name. Shared files are reference
+    counted by ``api.media``.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Refresh the mtime so the orphaned media collector's grace
+            # period covers a file that is about to be referenced again.
+            try:
+                os.utime(self.path(name))
+            except OSError:
+                pass
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # A name is derived from the content (or, for renditions, from the
+        # original), so a file already stored under it holds the same bytes
+        # and may be replaced instead of getting a suffixed name.
+        validate_file_name(name, allow_relative_path=True)
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            os.chmod(
+                temp_path,
+                0o644 if self.file_permissions_mode is None else self.file_permissions_mode,
+            )
+            os.replace(temp_path, full_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return name
+
+    def save_derived(self, name, content, max_length=None):
+        """Store a file derived from a stored one (a rendition) under ``name``."""
+        return super().save(name, content, max_length=max_length)
+
+    @staticmethod
+    def hashed_name(name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory, basename = posixpath.split(name)
+        ext = posixpath.splitext(basename)[1].lower()
+        hexdigest = digest.hexdigest()
+        return posixpath.join(directory, hexdigest[:2], hexdigest + ext)
@@ -1,3 +1,869 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+from itertools import product
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ingredients.models import Ingredient
+from recipes.models import Recipe, RecipeIngredient
+from .images import RENDITION_SEPARATOR, rendition_cache, rendition_names
+from .models import Favorite, MediaBlob, ShoppingCart, ShoppingListJob, Subscription
+from .query_plans import check_plan, hot_queries, pick_user
+from .relations import RELATIONS, get_relation_ids
+from .shopping_list import (
+    CART_PDF_KEY, JOB_ERROR_MESSAGE, get_cart_version, run_shopping_list_job,
+)
+from .storage import ContentAddressedStorage
+from .uploads import LimitedTemporaryFileUploadHandler
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+SMALL_PAGE = 2
+LARGE_PAGE = 10
+
+
+def make_image_bytes(image_format="PNG"):
+    buffer = BytesIO()
+    Image.new("RGB", (4, 4), "red").save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def make_image_base64():
+    return "data:image/png;base64," + base64.b64encode(make_image_bytes()).decode()
+
+
+def make_image_upload(name="image.png", image_format="PNG"):
+    return SimpleUploadedFile(name, make_image_bytes(image_format), content_type="image/png")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class SeededAPITestCase(TestCase):
+    """
+    Authors with recipes, and a viewer who follows them and has some of the
+    recipes in favorites and the cart, plus query-count assertions.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"ингредиент {i}", measurement_unit="г")
+            for i in range(8)
+        )
+        cls.viewer = User.objects.create_user(
+            username="viewer", email="viewer@example.com", password="pass",
+            first_name="Viewer", last_name="Viewer",
+        )
+        cls.authors = [
+            User.objects.create_user(
+                username=f"author{i}", email=f"author{i}@example.com", password="pass",
+                first_name="Author", last_name=str(i),
+            )
+            for i in range(LARGE_PAGE + 2)
+        ]
+        cls.recipes = []
+        for i, author in enumerate(cls.authors):
+            for j in range(2):
+                recipe = Recipe.objects.create(
+                    author=author, name=f"Рецепт {i}-{j}", text="Описание",
+                    cooking_time=10 + j, image="recipes/images/test.png",
+                )
+                RecipeIngredient.objects.bulk_create(
+                    RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=k + 1)
+                    for k, ingredient in enumerate(cls.ingredients[j:j + 3])
+                )
+                cls.recipes.append(recipe)
+
+        Subscription.objects.bulk_create(
+            Subscription(user=cls.viewer, author=author) for author in cls.authors
+        )
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.viewer, recipe=recipe) for recipe in cls.recipes[::2]
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.viewer, recipe=recipe) for recipe in cls.recipes[::3]
+        )
+        cls.token = Token.objects.create(user=cls.viewer)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        # Budgets describe the steady state, with the viewer's relation ids
+        # already cached; RelationCacheTestCase covers the cold load.
+        for name in RELATIONS:
+            get_relation_ids(self.viewer.pk, name)
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def count_queries(self, method, url, data=None, client=None, expected_status=200, headers=None):
+        client = client or self.client
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(client, method)(url, data, format="json", headers=headers)
+        self.assertEqual(response.status_code, expected_status, getattr(response, "data", None))
+        return len(context), response
+
+    def assertQueryBudget(self, budget, method, url, data=None, client=None, expected_status=200, headers=None):
+        count, response = self.count_queries(method, url, data, client, expected_status, headers)
+        self.assertLessEqual(count, budget, f"{method.upper()} {url} ran {count} queries")
+        return response
+
+    def assertPagedQueryBudget(self, budget, url, client=None, page_param="limit"):
+        separator = "&" if "?" in url else "?"
+        counts = {}
+        for size in (SMALL_PAGE, LARGE_PAGE):
+            counts[size], _ = self.count_queries(
+                "get", f"{url}{separator}{page_param}={size}", client=client
+            )
+        self.assertLessEqual(counts[LARGE_PAGE], budget, f"GET {url} ran {counts[LARGE_PAGE]} queries")
+        self.assertEqual(
+            counts[SMALL_PAGE], counts[LARGE_PAGE],
+            f"GET {url}: query count grows with page size {counts}",
+        )
+
+
+class QueryBudgetTestCase(SeededAPITestCase):
+    """
+    Every API route is called against the seeded dataset and must stay within
+    a declared number of SQL queries. List endpoints are measured at two page
+    sizes: a query count that grows with the page size is an N+1.
+    """
+
+    # Ingredients
+
+    def test_ingredient_list(self):
+        self.assertQueryBudget(1, "get", "/api/ingredients/", client=self.anonymous)
+        self.assertQueryBudget(1, "get", "/api/ingredients/?name=ингр", client=self.anonymous)
+
+    def test_ingredient_detail(self):
+        self.assertQueryBudget(1, "get", f"/api/ingredients/{self.ingredients[0].id}/", client=self.anonymous)
+
+    # Recipes
+
+    def test_recipe_list_filters(self):
+        author_values = (None, self.authors[0].id)
+        flag_values = (None, "1", "0")
+        for author, favorited, in_cart in product(author_values, flag_values, flag_values):
+            params = {
+                "author": author,
+                "is_favorited": favorited,
+                "is_in_shopping_cart": in_cart,
+            }
+            query = "&".join(f"{key}={value}" for key, value in params.items() if value is not None)
+            with self.subTest(**params):
+                self.assertPagedQueryBudget(5, f"/api/recipes/?{query}")
+
+    def test_recipe_list_anonymous(self):
+        self.assertPagedQueryBudget(3, "/api/recipes/", client=self.anonymous)
+
+    def test_recipe_list_cursor(self):
+        self.assertPagedQueryBudget(3, "/api/recipes/?cursor=")
+
+    def test_recipe_detail(self):
+        recipe = self.recipes[0]
+        self.assertQueryBudget(3, "get", f"/api/recipes/{recipe.id}/")
+        self.assertQueryBudget(2, "get", f"/api/recipes/{recipe.id}/", client=self.anonymous)
+
+    def test_recipe_links(self):
+        recipe = self.recipes[0]
+        self.assertQueryBudget(2, "get", f"/api/recipes/{recipe.id}/get-link/", client=self.anonymous)
+        self.assertQueryBudget(2, "get", f"/api/s/{recipe.id}/", client=self.anonymous)
+
+    def test_recipe_create_update_delete(self):
+        data = {
+            "ingredients": [
+                {"id": self.ingredients[0].id, "amount": 10},
+                {"id": self.ingredients[1].id, "amount": 20},
+            ],
+            "image": make_image_base64(),
+            "name": "Новый рецепт",
+            "text": "Описание",
+            "cooking_time": 5,
+        }
+        # Create and update count the SAVEPOINT pair of their transaction,
+        # which TestCase nests inside the per-test transaction; create also
+        # takes a reference on the stored image. Create and delete update
+        # the author's recipes_count.
+        response = self.assertQueryBudget(12, "post", "/api/recipes/", data, expected_status=201)
+        url = f"/api/recipes/{response.data['id']}/"
+        data.pop("image")
+        self.assertQueryBudget(14, "patch", url, data)
+        self.assertQueryBudget(10, "delete", url, expected_status=204)
+
+    def test_favorite_and_shopping_cart(self):
+        recipe = self.recipes[1]
+        for action in ("favorite", "shopping_cart"):
+            with self.subTest(action=action):
+                url = f"/api/recipes/{recipe.id}/{action}/"
+                # Both include the F() update of the recipe's counter.
+                self.assertQueryBudget(5, "post", url, expected_status=201)
+                # Deleting through the collector fetches the row for post_delete.
+                self.assertQueryBudget(6, "delete", url, expected_status=204)
+
+    @mock.patch("api.shopping_list.render_shopping_list_pdf", return_value=b"%PDF-1.7")
+    def test_download_shopping_cart(self, render):
+        self.assertQueryBudget(1, "get", "/api/recipes/download_shopping_cart/")
+        render.assert_called_once()
+
+    # Users
+
+    def test_user_list(self):
+        self.assertPagedQueryBudget(3, "/api/users/")
+        self.assertPagedQueryBudget(2, "/api/users/", client=self.anonymous)
+
+    def test_user_detail_and_me(self):
+        self.assertQueryBudget(2, "get", f"/api/users/{self.authors[0].id}/")
+        self.assertQueryBudget(1, "get", "/api/users/me/")
+
+    def test_subscriptions(self):
+        self.assertPagedQueryBudget(4, "/api/users/subscriptions/?recipes_limit=1")
+        self.assertPagedQueryBudget(4, "/api/users/subscriptions/")
+
+    def test_subscribe(self):
+        author = User.objects.create_user(
+            username="newauthor", email="new@example.com", password="pass",
+            first_name="New", last_name="Author",
+        )
+        url = f"/api/users/{author.id}/subscribe/"
+        self.assertQueryBudget(9, "post", url, expected_status=201)
+        self.assertQueryBudget(5, "delete", url, expected_status=204)
+
+    def test_avatar(self):
+        # Replacing or removing an avatar also updates the media reference counts.
+        self.assertQueryBudget(3, "put", "/api/users/me/avatar/", {"avatar": make_image_base64()})
+        self.assertQueryBudget(4, "delete", "/api/users/me/avatar/", expected_status=204)
+
+
+class RecipeFilterTestCase(SeededAPITestCase):
+    def test_recipe_search(self):
+        self.assertPagedQueryBudget(4, "/api/recipes/?search=Рецепт 3-")
+        response = self.anonymous.get("/api/recipes/?search=Рецепт 3-1")
+        self.assertEqual([recipe["name"] for recipe in response.data["results"]], ["Рецепт 3-1"])
+
+    def test_recipe_ingredient_and_cooking_time_filters(self):
+        first, second, third, fourth = (ingredient.id for ingredient in self.ingredients[:4])
+        cases = {
+            f"ingredients={first},{second}": 12,
+            f"ingredients={first},{fourth}": 0,
+            f"ingredients={first},{fourth}&ingredients_match=any": 24,
+            f"ingredients={second},{third}&ingredients_match=all": 24,
+            "cooking_time__lte=10": 12,
+            f"ingredients={second}&cooking_time__gte=11&cooking_time__lte=11": 12,
+        }
+        for query, count in cases.items():
+            with self.subTest(query=query):
+                response = self.anonymous.get(f"/api/recipes/?{query}")
+                self.assertEqual(response.data["count"], count)
+        self.assertPagedQueryBudget(3, f"/api/recipes/?ingredients={first},{second}", client=self.anonymous)
+        self.assertEqual(self.anonymous.get("/api/recipes/?ingredients=x").status_code, 400)
+
+
+class CursorPaginationTestCase(SeededAPITestCase):
+    def test_recipe_cursor_walks_feed(self):
+        expected = list(Recipe.objects.values_list("id", flat=True))
+        pages = []
+        url = "/api/recipes/?cursor=&limit=5"
+        while url:
+            response = self.anonymous.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            pages.append([recipe["id"] for recipe in response.data["results"]])
+            url = response.data["next"]
+        self.assertEqual(sum(pages, []), expected)
+
+        response = self.anonymous.get(response.data["previous"])
+        self.assertEqual([recipe["id"] for recipe in response.data["results"]], pages[-2])
+
+    def test_recipe_cursor_rejects_search(self):
+        response = self.client.get("/api/recipes/?cursor=&search=Рецепт")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("cursor", response.data)
+        self.assertEqual(self.client.get("/api/recipes/?cursor=&search=").status_code, 200)
+
+
+class ConditionalGetTestCase(SeededAPITestCase):
+    def test_recipe_detail_conditional_get(self):
+        url = f"/api/recipes/{self.recipes[1].id}/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.anonymous.get(url).status_code, 200)
+        self.assertNotEqual(self.anonymous.get(url)["ETag"], etag)
+
+        response = self.assertQueryBudget(3, "get", url, {}, expected_status=304, headers={"If-None-Match": etag})
+        self.assertEqual(response["ETag"], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"{url}favorite/")
+        self.assertEqual(self.client.get(url, headers={"If-None-Match": etag}).status_code, 200)
+
+    def test_recipe_detail_etag_follows_ingredient_catalog(self):
+        url = f"/api/recipes/{self.recipes[1].id}/"
+        etag = self.client.get(url)["ETag"]
+        ingredient = self.recipes[1].recipe_ingredients.first().ingredient
+        ingredient.measurement_unit = "кг"
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.save()
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("кг", {item["measurement_unit"] for item in response.data["ingredients"]})
+
+    def test_ingredient_list_conditional_get(self):
+        response = self.anonymous.get("/api/ingredients/?name=ингр")
+        self.assertQueryBudget(
+            0, "get", "/api/ingredients/?name=ингр", client=self.anonymous,
+            expected_status=304, headers={"If-None-Match": response["ETag"]},
+        )
+
+
+class RelationCacheTestCase(SeededAPITestCase):
+    def test_relation_ids_cache(self):
+        cache.clear()
+        count, _ = self.count_queries("get", "/api/recipes/")
+        self.assertQueryBudget(count - len(RELATIONS), "get", "/api/recipes/")
+
+        recipe = self.recipes[1]
+        self.assertFalse(self.client.get(f"/api/recipes/{recipe.id}/").data["is_favorited"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/recipes/{recipe.id}/favorite/")
+        self.assertTrue(self.client.get(f"/api/recipes/{recipe.id}/").data["is_favorited"])
+
+
+class RecipeUpdateTestCase(SeededAPITestCase):
+    def test_recipe_update_writes_ingredient_diff(self):
+        recipe = self.recipes[0]
+        client = APIClient()
+        client.force_authenticate(recipe.author)
+        before = {row.ingredient_id: row for row in recipe.recipe_ingredients.all()}
+        kept, changed, removed = sorted(before)
+        added = next(i.id for i in self.ingredients if i.id not in before)
+        data = {"ingredients": [
+            {"id": kept, "amount": before[kept].amount},
+            {"id": changed, "amount": before[changed].amount + 100},
+            {"id": added, "amount": 7},
+        ]}
+        with CaptureQueriesContext(connection) as queries:
+            response = client.patch(f"/api/recipes/{recipe.id}/", data, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        after = {row.ingredient_id: row for row in recipe.recipe_ingredients.all()}
+        self.assertEqual(set(after), {kept, changed, added})
+        self.assertEqual(after[kept].pk, before[kept].pk)
+        self.assertEqual(after[changed].pk, before[changed].pk)
+        self.assertEqual(after[changed].amount, before[changed].amount + 100)
+        self.assertEqual(after[added].amount, 7)
+        writes = [q["sql"] for q in queries if q["sql"].startswith(("INSERT", "UPDATE", "DELETE"))]
+        self.assertEqual(
+            sum(sql.startswith("DELETE") and "recipes_recipeingredient" in sql for sql in writes), 1
+        )
+
+
+class BatchRecipeListTestCase(SeededAPITestCase):
+    def test_batch_shopping_cart(self):
+        url = "/api/recipes/shopping_cart/"
+        in_cart, new = self.recipes[0], self.recipes[1:3]
+        # The batch is one read, one insert and one counter update however many ids it has.
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.assertQueryBudget(
+                7, "post", url, {"recipes": [new[0].id, in_cart.id, 999999, new[1].id]}
+            )
+        self.assertEqual(response.data["recipes"], [
+            {"id": new[0].id, "status": "added"},
+            {"id": in_cart.id, "status": "present"},
+            {"id": 999999, "status": "not_found"},
+            {"id": new[1].id, "status": "added"},
+        ])
+        new[0].refresh_from_db()
+        in_cart.refresh_from_db()
+        self.assertEqual(new[0].in_carts_count, 1)
+        # Only rows the batch actually added move the counter.
+        self.assertEqual(in_cart.in_carts_count, 0)
+        self.assertLessEqual({r.id for r in new}, get_relation_ids(self.viewer.pk, "cart"))
+
+        response = self.client.delete(url, {"recipes": [new[0].id, self.recipes[4].id]}, format="json")
+        self.assertEqual(response.data["recipes"], [
+            {"id": new[0].id, "status": "removed"},
+            {"id": self.recipes[4].id, "status": "absent"},
+        ])
+        new[0].refresh_from_db()
+        self.assertEqual(new[0].in_carts_count, 0)
+
+    def test_batch_remove_does_not_scale_with_size(self):
+        url = "/api/recipes/favorite/"
+        counts = []
+        for recipes in (self.recipes[:2], self.recipes[2:22]):
+            ids = [recipe.id for recipe in recipes]
+            self.client.post(url, {"recipes": ids}, format="json")
+            count, response = self.count_queries("delete", url, {"recipes": ids})
+            self.assertEqual({item["status"] for item in response.data["recipes"]}, {"removed"})
+            counts.append(count)
+        self.assertEqual(counts[0], counts[1])
+        self.assertLessEqual(counts[1], 7)
+
+    def test_batch_favorite_replace(self):
+        previous = set(Favorite.objects.filter(user=self.viewer).values_list("recipe_id", flat=True))
+        kept, added = self.recipes[0], self.recipes[1]
+        response = self.client.put(
+            "/api/recipes/favorite/", {"recipes": [kept.id, added.id]}, format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["recipes"][:2], [
+            {"id": kept.id, "status": "present"},
+            {"id": added.id, "status": "added"},
+        ])
+        self.assertEqual(
+            response.data["recipes"][2:],
+            [{"id": pk, "status": "removed"} for pk in sorted(previous - {kept.id})],
+        )
+        self.assertEqual(
+            set(Favorite.objects.filter(user=self.viewer).values_list("recipe_id", flat=True)),
+            {kept.id, added.id},
+        )
+        self.assertEqual(
+            self.anonymous.post("/api/recipes/favorite/", {"recipes": []}, format="json").status_code, 401
+        )
+
+
+class ShoppingListTestCase(SeededAPITestCase):
+    @mock.patch("api.shopping_list.render_shopping_list_pdf", return_value=b"%PDF-1.7")
+    def test_download_shopping_cart_defaults_to_pdf(self, render):
+        url = "/api/recipes/download_shopping_cart/"
+        for accept in ("application/json, text/plain, */*", "application/json", "*/*"):
+            with self.subTest(accept=accept):
+                response = self.client.get(url, HTTP_ACCEPT=accept)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["Content-Type"], "application/pdf")
+
+    def test_download_shopping_cart_text_formats(self):
+        url = "/api/recipes/download_shopping_cart/"
+        for query, accept, media_type in (
+            ("?format=txt", "*/*", "text/plain"),
+            ("?format=csv", "*/*", "text/csv"),
+            ("", "text/csv", "text/csv"),
+            ("", "text/plain", "text/plain"),
+        ):
+            with self.subTest(query=query, accept=accept):
+                with CaptureQueriesContext(connection) as context:
+                    response = self.client.get(url + query, HTTP_ACCEPT=accept)
+                    content = b"".join(response.streaming_content).decode()
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response["Content-Type"].startswith(media_type))
+                self.assertLessEqual(len(context), 2)
+                self.assertIn("ингредиент 0", content)
+
+        response = self.anonymous.get(url + "?format=csv")
+        self.assertEqual(response.status_code, 401)
+
+    @mock.patch("api.shopping_list.render_shopping_list_pdf", return_value=b"%PDF-1.7")
+    def test_download_shopping_cart_is_cached(self, render):
+        url = "/api/recipes/download_shopping_cart/"
+        self.client.get(url)
+        self.assertQueryBudget(1, "get", url)
+        self.assertEqual(render.call_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/recipes/{self.recipes[1].id}/shopping_cart/")
+        self.client.get(url)
+        self.assertEqual(render.call_count, 2)
+
+        recipe = self.recipes[0]
+        recipe_client = APIClient()
+        recipe_client.force_authenticate(recipe.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe_client.patch(f"/api/recipes/{recipe.id}/", {
+                "ingredients": [{"id": self.ingredients[0].id, "amount": 1}],
+            }, format="json")
+        self.client.get(url)
+        self.assertEqual(render.call_count, 3)
+
+    @mock.patch("api.shopping_list.render_shopping_list_pdf", return_value=b"%PDF-1.7")
+    def test_shopping_list_job(self, render):
+        response = self.assertQueryBudget(3, "post", "/api/recipes/shopping_list_jobs/", expected_status=202)
+        self.assertEqual(response.data["status"], ShoppingListJob.Status.PENDING)
+        url = response.data["url"]
+        self.assertQueryBudget(2, "get", url, expected_status=202)
+
+        call_command("process_shopping_list_jobs", "--once", stdout=StringIO())
+
+        response = self.assertQueryBudget(2, "get", url)
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF-1.7")
+        self.assertEqual(self.anonymous.get(url).status_code, 401)
+
+    @mock.patch("api.shopping_list.render_shopping_list_pdf", return_value=b"%PDF-fresh")
+    def test_shopping_list_job_skips_pdf_cache(self, render):
+        cache.set(
+            CART_PDF_KEY.format(user_id=self.viewer.pk, version=get_cart_version(self.viewer.pk)),
+            b"%PDF-stale",
+        )
+        job = run_shopping_list_job(ShoppingListJob.objects.create(user=self.viewer))
+        self.assertEqual(bytes(job.pdf), b"%PDF-fresh")
+
+    @mock.patch("api.shopping_list.render_shopping_list_pdf", side_effect=OSError("/secret/path"))
+    def test_shopping_list_job_failure_hides_details(self, render):
+        job = ShoppingListJob.objects.create(user=self.viewer)
+        with self.assertLogs("api.shopping_list", "ERROR"):
+            run_shopping_list_job(job)
+        response = self.client.get(f"/api/recipes/shopping_list_jobs/{job.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "failed")
+        self.assertEqual(response.data["error"], JOB_ERROR_MESSAGE)
+
+
+class SubscriptionsTestCase(SeededAPITestCase):
+    def test_subscriptions_recipes_limit(self):
+        response = self.client.get("/api/users/subscriptions/?limit=3&recipes_limit=1")
+        for author in response.data["results"]:
+            recipes = Recipe.objects.filter(author_id=author["id"])
+            self.assertTrue(author["is_subscribed"])
+            self.assertEqual(author["recipes_count"], recipes.count())
+            self.assertEqual([recipe["id"] for recipe in author["recipes"]], [recipes.first().id])
+
+
+class AdminTestCase(SeededAPITestCase):
+    def test_admin_changelists(self):
+        admin_user = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="pass",
+            first_name="Admin", last_name="Admin",
+        )
+        client = Client()
+        client.force_login(admin_user)
+        cases = {
+            "/admin/recipes/recipe/": Recipe.objects.count(),
+            f"/admin/recipes/recipe/?author={self.authors[1].username}": 2,
+            "/admin/recipes/recipeingredient/?ingredient_name=ингредиент 1": len(self.recipes),
+            "/admin/ingredients/ingredient/": len(self.ingredients),
+            "/admin/users/user/": User.objects.count(),
+            "/admin/users/user/?has_recipes=yes": len(self.authors),
+            "/admin/users/user/?has_subscriptions=yes": 1,
+            "/admin/users/user/?has_subscribers=no": 2,
+        }
+        for url, result_count in cases.items():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as context:
+                    response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context["cl"].result_count, result_count)
+                self.assertLessEqual(len(context), 5, f"GET {url} ran {len(context)} queries")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ImageUploadTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredient = Ingredient.objects.create(name="соль", measurement_unit="г")
+        cls.user = User.objects.create_user(
+            username="uploader", email="uploader@example.com", password="pass",
+            first_name="Up", last_name="Loader",
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post_recipe(self, image):
+        return self.client.post("/api/recipes/", {
+            "ingredients": json.dumps([{"id": self.ingredient.id, "amount": 5}]),
+            "image": image,
+            "name": "Рецепт",
+            "text": "Описание",
+            "cooking_time": 5,
+        }, format="multipart")
+
+    def test_multipart_recipe_create(self):
+        response = self.post_recipe(make_image_upload())
+        self.assertEqual(response.status_code, 201, response.data)
+        recipe = Recipe.objects.get(pk=response.data["id"])
+        self.assertTrue(recipe.image.storage.exists(recipe.image.name))
+        self.assertEqual(response.data["ingredients"][0]["amount"], 5)
+
+    def test_multipart_avatar(self):
+        response = self.client.put(
+            "/api/users/me/avatar/", {"avatar": make_image_upload()}, format="multipart"
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.avatar.storage.exists(self.user.avatar.name))
+
+    def test_rejects_oversized_upload(self):
+        with mock.patch("api.serializers.fields.MAX_IMAGE_SIZE", 10), \
+                mock.patch("api.uploads.MAX_IMAGE_SIZE", 10):
+            response = self.post_recipe(make_image_upload())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("image", response.data)
+
+    def test_upload_limit_is_api_only(self):
+        self.assertNotIn("api.uploads.LimitedTemporaryFileUploadHandler", settings.FILE_UPLOAD_HANDLERS)
+        with mock.patch.object(
+            LimitedTemporaryFileUploadHandler, "receive_data_chunk", autospec=True,
+            side_effect=LimitedTemporaryFileUploadHandler.receive_data_chunk,
+        ) as receive:
+            response = self.post_recipe(make_image_upload())
+        self.assertEqual(response.status_code, 201, response.data)
+        receive.assert_called()
+
+    def test_rejects_large_dimensions(self):
+        with mock.patch("api.serializers.fields.MAX_IMAGE_PIXELS", 10):
+            response = self.post_recipe(make_image_upload())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(str(response.data["image"][0]), "Image dimensions are too large")
+
+    def test_rejects_unsupported_format(self):
+        response = self.post_recipe(make_image_upload("image.bmp", "BMP"))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(str(response.data["image"][0]), "Invalid image format")
+
+    def test_renditions_generated_on_save(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post_recipe(make_image_upload())
+        recipe = Recipe.objects.get(pk=response.data["id"])
+        names = rendition_names(recipe.image.name, "recipe")
+        for formats in names.values():
+            for name in formats.values():
+                self.assertTrue(recipe.image.storage.exists(name), name)
+        card = response.data["image_renditions"]["card"]
+        self.assertEqual(set(card), {"png", "webp"})
+        self.assertTrue(card["webp"].endswith(names["card"]["webp"]))
+
+    def test_missing_renditions_generated_on_access(self):
+        response = self.post_recipe(make_image_upload())
+        recipe = Recipe.objects.get(pk=response.data["id"])
+        storage = recipe.image.storage
+        detail = rendition_names(recipe.image.name, "recipe")["detail"]["webp"]
+        storage.delete(detail)
+        rendition_cache.clear()
+        response = self.client.get(f"/api/recipes/{recipe.id}/")
+        self.assertTrue(storage.exists(detail))
+        with storage.open(detail) as file, Image.open(file) as image:
+            self.assertEqual(image.format, "WEBP")
+
+    def test_missing_original_is_remembered(self):
+        recipe = Recipe.objects.create(
+            author=self.user, name="Рецепт", text="Описание", cooking_time=1,
+            image="recipes/images/missing.png",
+        )
+        rendition_cache.clear()
+        with mock.patch("api.images.generate_renditions", side_effect=FileNotFoundError) as generate:
+            for _ in range(2):
+                response = self.client.get(f"/api/recipes/{recipe.id}/")
+                self.assertIsNone(response.data["image_renditions"])
+        names = [call.args[1] for call in generate.call_args_list]
+        self.assertEqual(names.count("recipes/images/missing.png"), 1)
+
+    def test_unchanged_image_is_not_decoded_again(self):
+        recipe = Recipe.objects.get(pk=self.post_recipe(make_image_upload()).data["id"])
+        name = recipe.image.name
+        url = f"/api/recipes/{recipe.id}/"
+        ingredients = [{"id": self.ingredient.id, "amount": 5}]
+        for image in (recipe.image.url, make_image_base64()):
+            with self.subTest(image=image[:20]), \
+                    mock.patch("api.serializers.fields.Base64ImageField.check_header") as check_header:
+                response = self.client.patch(
+                    url, {"image": image, "ingredients": ingredients}, format="json"
+                )
+                self.assertEqual(response.status_code, 200, response.data)
+                check_header.assert_not_called()
+                recipe.refresh_from_db()
+                self.assertEqual(recipe.image.name, name)
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+
+    def test_concurrent_identical_saves_keep_hashed_name(self):
+        storage = ContentAddressedStorage()
+        # Both writers miss the existence check, as in a race.
+        with mock.patch.object(ContentAddressedStorage, "exists", return_value=False):
+            first = storage.save("recipes/images/a.png", ContentFile(make_image_bytes()))
+            second = storage.save("recipes/images/b.png", ContentFile(make_image_bytes()))
+        self.assertEqual(first, second)
+        self.assertRegex(first, r"^recipes/images/[0-9a-f]{2}/[0-9a-f]{64}\.png$")
+        leftovers = [
+            name for name in os.listdir(os.path.dirname(storage.path(first)))
+            if name != os.path.basename(first) and RENDITION_SEPARATOR not in name
+        ]
+        self.assertEqual(leftovers, [])
+
+    def test_identical_uploads_share_one_blob(self):
+        first = Recipe.objects.get(pk=self.post_recipe(make_image_upload()).data["id"])
+        second = Recipe.objects.get(pk=self.post_recipe(make_image_upload("other.png")).data["id"])
+        name, storage = first.image.name, first.image.storage
+        self.assertEqual(second.image.name, name)
+        self.assertRegex(name, r"^recipes/images/[0-9a-f]{2}/[0-9a-f]{64}\.png$")
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/recipes/{first.id}/")
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/recipes/{second.id}/")
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CollectOrphanedMediaTestCase(TestCase):
+    def setUp(self):
+        self.directory = os.path.join(MEDIA_ROOT, "recipes", "images", "gc")
+        os.makedirs(self.directory, exist_ok=True)
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        author = User.objects.create_user(
+            username="gc", email="gc@example.com", password="pass",
+            first_name="G", last_name="C",
+        )
+        Recipe.objects.create(
+            author=author, name="Рецепт", text="Описание", cooking_time=1,
+            image="recipes/images/gc/kept.png",
+        )
+        self.old = time.time() - 2 * 24 * 60 * 60
+        self.paths = {
+            name: self.make_file(name, recent=name == "recent.png")
+            for name in ("kept.png", "kept__card.webp", "orphan.png", "orphan__card.webp", "recent.png")
+        }
+
+    def make_file(self, name, recent=False):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as file:
+            file.write(b"data")
+        if not recent:
+            os.utime(path, (self.old, self.old))
+        return path
+
+    def existing(self):
+        return {name for name, path in self.paths.items() if os.path.exists(path)}
+
+    def test_dry_run_keeps_files(self):
+        out = StringIO()
+        call_command("collect_orphaned_media", "--dry-run", stdout=out)
+        self.assertEqual(self.existing(), set(self.paths))
+        self.assertIn("Would delete 2 orphaned files", out.getvalue())
+
+    def test_deletes_unreferenced_files_past_grace_period(self):
+        out = StringIO()
+        call_command("collect_orphaned_media", "--batch-size", "2", stdout=out)
+        self.assertEqual(self.existing(), {"kept.png", "kept__card.webp", "recent.png"})
+        self.assertIn("Deleted 2 orphaned files", out.getvalue())
+
+
+class CountersTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="reader", email="reader@example.com", password="pass",
+            first_name="R", last_name="R",
+        )
+        cls.author = User.objects.create_user(
+            username="writer", email="writer@example.com", password="pass",
+            first_name="W", last_name="W",
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name="Рецепт", text="Описание", cooking_time=1,
+            image="recipes/images/test.png",
+        )
+
+    def assertCounters(self, **expected):
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.user.refresh_from_db()
+        actual = {
+            "favorites_count": self.recipe.favorites_count,
+            "in_carts_count": self.recipe.in_carts_count,
+            "recipes_count": self.author.recipes_count,
+            "followers_count": self.author.followers_count,
+            "following_count": self.user.following_count,
+        }
+        self.assertEqual(actual, {**actual, **expected})
+
+    def test_counters_follow_writes(self):
+        self.assertCounters(recipes_count=1, favorites_count=0, followers_count=0)
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        Subscription.objects.create(user=self.user, author=self.author)
+        self.assertCounters(favorites_count=1, in_carts_count=1, followers_count=1, following_count=1)
+
+        Favorite.objects.filter(user=self.user).delete()
+        Subscription.objects.filter(user=self.user).delete()
+        self.assertCounters(favorites_count=0, in_carts_count=1, followers_count=0, following_count=0)
+
+        Recipe.objects.filter(pk=self.recipe.pk).delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+
+    def test_save_keeps_concurrent_counter_updates(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        author = User.objects.get(pk=self.author.pk)
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Subscription.objects.create(user=self.user, author=self.author)
+        recipe.name = "Новое название"
+        recipe.save()
+        author.first_name = "Writer"
+        author.save()
+        self.assertCounters(favorites_count=1, followers_count=1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, "Новое название")
+
+    def test_reconcile_counters(self):
+        Favorite.objects.bulk_create([Favorite(user=self.user, recipe=self.recipe)])
+        Subscription.objects.bulk_create([Subscription(user=self.user, author=self.author)])
+        User.objects.filter(pk=self.author.pk).update(recipes_count=7)
+        call_command("reconcile_counters", "--batch-size", "1", stdout=StringIO())
+        self.assertCounters(
+            favorites_count=1, in_carts_count=0, recipes_count=1,
+            followers_count=1, following_count=1,
+        )
+
+
+class QueryPlanTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f"Ингредиент {i}", measurement_unit="г") for i in range(20)
+        )
+        call_command(
+            "generate_dataset", "--users", "200", "--recipes", "2000",
+            "--favorites", "5000", "--carts", "1000", "--subscriptions", "2000",
+            stdout=StringIO(),
+        )
+
+    def test_check_plan(self):
+        plan = {
+            "Node Type": "Hash Join",
+            "Total Cost": 120.0,
+            "Plans": [
+                {"Node Type": "Seq Scan", "Relation Name": "recipes_recipe", "Total Cost": 80.0},
+                {"Node Type": "Seq Scan", "Relation Name": "users_user", "Total Cost": 30.0},
+            ],
+        }
+        self.assertEqual(check_plan(plan, {"ingredients_ingredient"}, 1000), [])
+        self.assertEqual(
+            check_plan(plan, {"recipes_recipe"}, 100),
+            ["sequential scan on recipes_recipe", "total cost 120 is over 100"],
+        )
+
+    def test_hot_queries_run(self):
+        for name, queryset in hot_queries(pick_user()).items():
+            with self.subTest(name):
+                list(queryset)
+
+    @skipUnless(connection.vendor == "postgresql", "EXPLAIN plans are checked on PostgreSQL")
+    def test_query_plans(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        call_command("check_query_plans", "--seq-scan-threshold", "1500", stdout=StringIO())
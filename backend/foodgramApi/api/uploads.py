@@ -0,0 +1,36 @@
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+from .serializers.fields import MAX_IMAGE_SIZE
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Spool uploaded files to a temporary file chunk by chunk.
+
+    Writing stops once a file exceeds ``MAX_IMAGE_SIZE``. The reported size
+    still counts every received byte, so validation rejects the upload
+    without the rest of it ever reaching the disk.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= MAX_IMAGE_SIZE:
+            self.file.write(raw_data)
+
+
+class LimitedUploadMixin:
+    """
+    Parse multipart bodies of the view with ``LimitedTemporaryFileUploadHandler``.
+
+    The handler is installed per view rather than in ``FILE_UPLOAD_HANDLERS``:
+    it relies on the serializers to reject what it cut off, and other upload
+    forms (the admin) have no such check.
+    """
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [LimitedTemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
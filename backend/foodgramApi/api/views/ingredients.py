@@ -2,6 +2,9 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from rest_framework.pagination import _positive_int
+from ingredients.catalog import get_ingredient_index
+from api.conditional import make_etag, not_modified_response, set_validators
 from ingredients.models import Ingredient
 from api.serializers.ingredients import IngredientSerializer
 from rest_framework.viewsets import ReadOnlyModelViewSet
@@ -20,3 +23,17 @@ class IngredientViewSet(ReadOnlyModelViewSet):
             queryset = queryset.filter(name__istartswith=name_param)
         
         return queryset
+
+    def list(self, request, *args, **kwargs):
+        # Autocomplete is answered from the in-process catalog index.
+        try:
+            limit = _positive_int(request.query_params['limit'], strict=True)
+        except (KeyError, ValueError):
+            limit = None
+        name = request.query_params.get('name', '')
+        index = get_ingredient_index()
+        etag = make_etag(index.version, name, limit)
+        response = not_modified_response(request, etag)
+        if response is not None:
+            return response
+        return set_validators(Response(index.search(name, limit)), etag)
@@ -3,20 +3,34 @@ from django.shortcuts import get_object_or_404
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated, SAFE_METHODS, BasePermission
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 from django.contrib.auth import get_user_model
-from django.db.models import Sum, Exists, OuterRef
-from ..models import Favorite, ShoppingCart
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Q
+from ..models import Favorite, ShoppingCart, ShoppingListJob
+from ingredients.catalog import get_catalog_version
 from recipes.models import Recipe, RecipeIngredient
+from ..conditional import make_etag, not_modified_response, set_validators
+from ..pagination import RecipePagination, RecipeCursorPagination
+from ..relations import CART, FAVORITES, FOLLOWING, get_user_relations
+from ..recipe_lists import ADD, REMOVE, REPLACE, change_recipe_list
+from ..renderers import CSVRenderer, PDFRenderer, PlainTextRenderer, ShoppingListNegotiation
+from ..shopping_list import (
+    enqueue_shopping_list_job,
+    get_shopping_list_pdf,
+    iter_shopping_list_csv,
+    iter_shopping_list_txt,
+)
+from ..uploads import LimitedUploadMixin
 from ..serializers.recipes import (
     RecipeListSerializer,
     RecipeCreateSerializer,
+    RecipeIdsSerializer,
     ShortRecipeSerializer
 )
-from django.template.loader import render_to_string
-from weasyprint import HTML
-from django.http import Http404, FileResponse
+from django.http import Http404, FileResponse, StreamingHttpResponse
 from django.urls import reverse
 
 from django_filters.rest_framework import DjangoFilterBackend
@@ -24,29 +38,66 @@ import django_filters
 
 User = get_user_model()
 
+class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    pass
+
+
 class RecipeFilter(django_filters.FilterSet):
     is_favorited = django_filters.CharFilter(method='filter_is_favorited')
     is_in_shopping_cart = django_filters.CharFilter(method='filter_is_in_shopping_cart')
+    search = django_filters.CharFilter(method='filter_search')
+    ingredients = NumberInFilter(method='filter_ingredients')
+    ingredients_match = django_filters.ChoiceFilter(
+        choices=(('all', 'all'), ('any', 'any')), method='filter_noop'
+    )
+    cooking_time__lte = django_filters.NumberFilter(field_name='cooking_time', lookup_expr='lte')
+    cooking_time__gte = django_filters.NumberFilter(field_name='cooking_time', lookup_expr='gte')
 
     class Meta:
         model = Recipe
-        fields = ['author', 'is_favorited', 'is_in_shopping_cart']
+        fields = [
+            'author', 'is_favorited', 'is_in_shopping_cart', 'search',
+            'ingredients', 'ingredients_match', 'cooking_time__lte', 'cooking_time__gte',
+        ]
 
-    def filter_is_favorited(self, queryset, name, value):
-        return self._filter_by_user_relation(
-            queryset,
-            relation='favorited_by_users_relations__user',
-            value=value
+    def filter_noop(self, queryset, name, value):
+        return queryset
+
+    def filter_ingredients(self, queryset, name, value):
+        ingredient_ids = {int(ingredient_id) for ingredient_id in value}
+        if not ingredient_ids:
+            return queryset
+        matches = RecipeIngredient.objects.filter(ingredient_id__in=ingredient_ids)
+        if self.form.cleaned_data.get('ingredients_match') != 'any':
+            # One GROUP BY over the (ingredient, recipe) index instead of a
+            # join per ingredient.
+            matches = matches.values('recipe_id').annotate(
+                matched=Count('ingredient_id')
+            ).filter(matched=len(ingredient_ids))
+        return queryset.filter(id__in=matches.values('recipe_id'))
+
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        if connections[queryset.db].vendor != 'postgresql':
+            return queryset.filter(Q(name__icontains=value) | Q(text__icontains=value))
+        query = (
+            SearchQuery(value, config='russian', search_type='websearch')
+            | SearchQuery(value, config='simple', search_type='websearch')
         )
+        # Ties in rank keep the feed order, so results stay stable across pages.
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', '-created', 'id')
+
+    def filter_is_favorited(self, queryset, name, value):
+        return self._filter_by_user_relation(queryset, Favorite, value)
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        return self._filter_by_user_relation(
-            queryset,
-            relation='in_shopping_carts_of_users__user',
-            value=value
-        )
+        return self._filter_by_user_relation(queryset, ShoppingCart, value)
 
-    def _filter_by_user_relation(self, queryset, relation, value):
+    def _filter_by_user_relation(self, queryset, model, value):
         user = self.request.user
         if not value or user.is_anonymous:
             return queryset
@@ -54,35 +105,80 @@ class RecipeFilter(django_filters.FilterSet):
         true_values = {'1', 'true'}
         is_true = str(value).lower() in true_values
 
-        if is_true:
-            return queryset.filter(**{relation: user})
-        return queryset.exclude(**{relation: user})
-
+        # EXISTS plans as a semi/anti-join on the (user, recipe) constraint
+        # index, where exclude() over the relation would be a NOT IN subplan.
+        related = Exists(model.objects.filter(user=user, recipe=OuterRef('pk')))
+        return queryset.filter(related if is_true else ~related)
 
-class RecipePagination(PageNumberPagination):
-    page_size = 6
-    page_size_query_param = "limit"
-    max_page_size = 100
 
 class IsAuthorOrReadOnly(BasePermission):    
     def has_object_permission(self, request, view, obj):
         return request.method in SAFE_METHODS or obj.author == request.user
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+class RecipeViewSet(LimitedUploadMixin, viewsets.ModelViewSet):
+    queryset = Recipe.objects.select_related('author').defer('search_vector').prefetch_related(
+        Prefetch(
+            'recipe_ingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient'),
+        )
+    )
     pagination_class = RecipePagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
 
+    @property
+    def paginator(self):
+        # Clients opt into keyset pagination by passing ``cursor`` (empty for
+        # the first page); page/limit keep working for everyone else.
+        if not hasattr(self, '_paginator') and self.request is not None:
+            params = self.request.query_params
+            if RecipeCursorPagination.cursor_query_param in params:
+                # Search results are ordered by rank, which the (created, id)
+                # keyset cannot express.
+                if params.get('search', '').strip():
+                    raise ValidationError(
+                        {"cursor": ["Cursor pagination cannot be combined with search."]}
+                    )
+                self._paginator = RecipeCursorPagination()
+        return super().paginator
+
+    def retrieve(self, request, *args, **kwargs):
+        recipe = self.get_object()
+        author = recipe.author
+        relations = get_user_relations(request)
+        etag = make_etag(
+            recipe.pk, recipe.updated.isoformat(),
+            relations.has(FAVORITES, recipe.pk),
+            relations.has(CART, recipe.pk),
+            relations.has(FOLLOWING, author.pk),
+            author.pk, author.username, author.email, author.first_name, author.last_name, author.avatar.name,
+            # Ingredient names and units are rendered from the catalog.
+            get_catalog_version(),
+        )
+        # Viewer-specific flags are part of the ETag only, so Last-Modified
+        # is safe to send to anonymous clients alone.
+        last_modified = None if request.user.is_authenticated else recipe.updated
+        response = not_modified_response(request, etag, last_modified)
+        if response is not None:
+            return response
+        response = Response(self.get_serializer(recipe).data)
+        return set_validators(response, etag, last_modified)
+
     def get_serializer_class(self):
         if self.action in ['create', 'partial_update', 'update']:
             return RecipeCreateSerializer
         if self.action in ['favorite', 'shopping_cart'] and self.request.method == 'POST':
             return ShortRecipeSerializer 
+        if self.action in ['favorite_batch', 'shopping_cart_batch']:
+            return RecipeIdsSerializer
         return RecipeListSerializer
 
     def get_permissions(self):
-        if self.action in ['create', 'favorite', 'shopping_cart', 'download_shopping_cart']:
+        if self.action in [
+            'create', 'favorite', 'shopping_cart', 'download_shopping_cart',
+            'create_shopping_list_job', 'shopping_list_job',
+            'favorite_batch', 'shopping_cart_batch',
+        ]:
             self.permission_classes = [IsAuthenticated]
         elif self.action in ['partial_update', 'update', 'destroy']:
             self.permission_classes = [IsAuthenticated, IsAuthorOrReadOnly]
@@ -108,6 +204,30 @@ class RecipeViewSet(viewsets.ModelViewSet):
             request, pk, ShoppingCart, "списке покупок", "shopping_cart"
         )
 
+    @action(
+        detail=False, methods=['post', 'put', 'delete'], permission_classes=[IsAuthenticated],
+        url_path='favorite', url_name='favorite-batch',
+    )
+    def favorite_batch(self, request):
+        return self._handle_recipe_batch(request, Favorite)
+
+    @action(
+        detail=False, methods=['post', 'put', 'delete'], permission_classes=[IsAuthenticated],
+        url_path='shopping_cart', url_name='shopping-cart-batch',
+    )
+    def shopping_cart_batch(self, request):
+        return self._handle_recipe_batch(request, ShoppingCart)
+
+    def _handle_recipe_batch(self, request, model):
+        """POST adds the listed recipes, DELETE removes them, PUT makes the list exactly them."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        mode = {'POST': ADD, 'DELETE': REMOVE, 'PUT': REPLACE}[request.method]
+        outcomes = change_recipe_list(
+            model, request.user, serializer.validated_data['recipes'], mode
+        )
+        return Response({"recipes": outcomes})
+
     def _handle_recipe_action(self, request, pk, model, error_message, action_name):
         recipe = get_object_or_404(Recipe, pk=pk)
         user = request.user
@@ -131,23 +251,57 @@ class RecipeViewSet(viewsets.ModelViewSet):
         entry.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[PDFRenderer, PlainTextRenderer, CSVRenderer],
+        content_negotiation_class=ShoppingListNegotiation,
+    )
     def download_shopping_cart(self, request):
-        recipe_ids = ShoppingCart.objects.filter(user=request.user).values_list('recipe_id', flat=True)
-        
-        ingredients = (
-            RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
-            .values("ingredient__name", "ingredient__measurement_unit")
-            .annotate(total_amount=Sum("amount"))
-            .order_by("ingredient__name")
-        )
+        renderer = request.accepted_renderer
+        if renderer.format == PDFRenderer.format:
+            pdf_file = BytesIO(get_shopping_list_pdf(request.user))
+            return FileResponse(pdf_file, as_attachment=True, filename="shopping_list.pdf", content_type="application/pdf")
 
-        html = render_to_string("shopping_list.html", {"ingredients": ingredients})
+        # Text formats are streamed straight from the aggregate query.
+        streams = {
+            PlainTextRenderer.format: iter_shopping_list_txt,
+            CSVRenderer.format: iter_shopping_list_csv,
+        }
+        response = StreamingHttpResponse(
+            streams[renderer.format](request.user),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
+        )
+        response["Content-Disposition"] = f'attachment; filename="shopping_list.{renderer.format}"'
+        return response
 
-        pdf_file = BytesIO(HTML(string=html, encoding="utf-8").write_pdf())
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated], url_path='shopping_list_jobs')
+    def create_shopping_list_job(self, request):
+        job = enqueue_shopping_list_job(request.user)
+        return Response(
+            {"id": job.id, "status": job.status, "url": request.build_absolute_uri(f"{job.id}/")},
+            status=status.HTTP_202_ACCEPTED
+        )
 
-        response = FileResponse(pdf_file, as_attachment=True, filename="shopping_list.pdf", content_type="application/pdf")
-        return response
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        url_path=r'shopping_list_jobs/(?P<job_id>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})',
+    )
+    def shopping_list_job(self, request, job_id=None):
+        job = get_object_or_404(ShoppingListJob, pk=job_id, user=request.user)
+        if job.status == ShoppingListJob.Status.DONE:
+            return FileResponse(
+                BytesIO(job.pdf), as_attachment=True, filename="shopping_list.pdf", content_type="application/pdf"
+            )
+        data = {"id": job.id, "status": job.status}
+        if job.status == ShoppingListJob.Status.FAILED:
+            # The poll itself succeeded; the job's failure is part of its status.
+            data["error"] = job.error
+            return Response(data, status=status.HTTP_200_OK)
+        return Response(data, status=status.HTTP_202_ACCEPTED)
 
     @action(detail=True, methods=['get'], permission_classes=[AllowAny], url_path='get-link', url_name='get-link')
     def get_link(self, request, pk=None):
@@ -162,7 +316,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         
     @action(detail=False, methods=['get'], permission_classes=[AllowAny], url_path='s', url_name='short')
     def short_link(self, request, hash=None):
-        recipe = get_object_or_404(Recipe, pk=hash)
+        recipe = get_object_or_404(self.get_queryset(), pk=hash)
         serializer = self.get_serializer(recipe)
         return Response(serializer.data)
 
@@ -4,22 +4,27 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
-from django.core.files.storage import default_storage
+from collections import defaultdict
+from django.db.models import F, Value, Window
+from django.db.models.functions import RowNumber
+from recipes.models import Recipe
 from ..models import Subscription
 from ..serializers.users import (
     UserWithRecipesSerializer,
     FoodgramUserSerializer,
-    UserAvatarSerializer
+    UserAvatarSerializer,
+    get_recipes_limit,
 )
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework.pagination import LimitOffsetPagination  
 from rest_framework.exceptions import NotAuthenticated
-from .recipes import RecipePagination
+from ..pagination import RecipePagination
+from ..uploads import LimitedUploadMixin
 
 User = get_user_model()
 
 
-class UserActionsViewSet(DjoserUserViewSet):
+class UserActionsViewSet(LimitedUploadMixin, DjoserUserViewSet):
     pagination_class = LimitOffsetPagination  
 
     @action(detail=False, permission_classes=[IsAuthenticated])
@@ -31,12 +36,9 @@ class UserActionsViewSet(DjoserUserViewSet):
         user = request.user
         if request.method == "DELETE":
             if user.avatar:
-                if hasattr(user.avatar, 'path') and user.avatar.name != "users/image.png":
-                    default_storage.delete(user.avatar.path)
-                elif user.avatar.name != "users/image.png":
-                    user.avatar.delete(save=False)
+                # The file itself is released by the media reference count.
                 user.avatar = None
-                user.save()
+                user.save(update_fields=['avatar'])
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         serializer = UserAvatarSerializer(user, data=request.data, context={'request': request})
@@ -48,18 +50,43 @@ class UserActionsViewSet(DjoserUserViewSet):
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        user = request.user
-        subscribed_author_ids = Subscription.objects.filter(user=user).values_list('author_id', flat=True)
-        authors_user_is_subscribed_to = User.objects.filter(id__in=subscribed_author_ids)
+        authors = User.objects.filter(followers__user=request.user).annotate(
+            is_subscribed=Value(True),
+        ).order_by('username')
 
         paginator = RecipePagination()
-        result_page = paginator.paginate_queryset(authors_user_is_subscribed_to, request)
+        result_page = paginator.paginate_queryset(authors, request)
+        self._attach_page_recipes(result_page, get_recipes_limit(request))
         serializer = UserWithRecipesSerializer(
             result_page, many=True, context={"request": request}
         )
         return paginator.get_paginated_response(serializer.data)
-            
-    
+
+    @staticmethod
+    def page_recipes_queryset(authors, recipes_limit):
+        """The first ``recipes_limit`` recipes of every author, as one windowed query."""
+        recipes = Recipe.objects.filter(author__in=authors).only(
+            'id', 'name', 'image', 'cooking_time', 'author_id', 'created'
+        )
+        if recipes_limit is not None:
+            recipes = recipes.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F('author_id'),
+                    order_by=(F('created').desc(), F('id').asc()),
+                )
+            ).filter(row_number__lte=recipes_limit)
+        return recipes
+
+    @classmethod
+    def _attach_page_recipes(cls, authors, recipes_limit):
+        """Load the page recipes of every author on the page with a single query."""
+        recipes_by_author = defaultdict(list)
+        for recipe in cls.page_recipes_queryset(authors, recipes_limit):
+            recipes_by_author[recipe.author_id].append(recipe)
+        for author in authors:
+            author.page_recipes = recipes_by_author[author.id]
+
     @action(detail=True, methods=['post', 'delete'], permission_classes=[IsAuthenticated])
     def subscribe(self, request, id=None):
         author_to_subscribe_to = get_object_or_404(User, id=id)
@@ -81,7 +108,8 @@ class UserActionsViewSet(DjoserUserViewSet):
                     {"errors": f"Вы уже подписаны на пользователя {author_to_subscribe_to.username}."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            
+
+            author_to_subscribe_to.is_subscribed = True
             serializer = UserWithRecipesSerializer(author_to_subscribe_to, context={"request": request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -0,0 +1,29 @@
+"""
+Version tokens for cached data.
+
+A version is an opaque token stored in the cache without expiry; cached
+values put it in their own keys. Dropping the token once the transaction
+that changed the data commits retires every value cached under it, so
+readers never see data older than the last committed write.
+"""
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def get_version(key):
+    """The current token under ``key``, creating one if there is none."""
+    version = cache.get(key)
+    if version is None:
+        # add() keeps a token a concurrent reader has just created.
+        cache.add(key, uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_versions(keys):
+    """Drop the tokens under ``keys`` once the current transaction commits."""
+    keys = list(keys)
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 
 from dotenv import dotenv_values
@@ -20,6 +21,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 env_path = Path(__file__).resolve().parent.parent.parent.parent / '.env'
 config = dotenv_values(env_path)
+# CI points the tests at its database through DB_* environment variables.
+config.update({key: value for key, value in os.environ.items() if key.startswith("DB_")})
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -89,9 +92,19 @@ WSGI_APPLICATION = "foodgramApi.wsgi.application"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+STORAGES = {
+    "default": {"BACKEND": "api.storage.ContentAddressedStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Test runs (manage.py test / pytest) use a local SQLite database unless
+# DB_ENGINE explicitly asks for PostgreSQL.
+TESTING = sys.argv[1:2] == ["test"] or "pytest" in sys.modules
+DB_ENGINE = config.get("DB_ENGINE") or ("sqlite" if TESTING else "postgresql")
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -106,6 +119,38 @@ DATABASES = {
     }
 }
 
+if DB_ENGINE == "sqlite":
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db.sqlite3",
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+FILE_BASED_CACHE = "django.core.cache.backends.filebased.FileBasedCache"
+
+CACHES = {
+    "default": {
+        "BACKEND": config.get("CACHE_BACKEND", FILE_BASED_CACHE),
+        "LOCATION": config.get("CACHE_LOCATION", os.path.join(BASE_DIR, "cache")),
+    }
+}
+
+if CACHES["default"]["BACKEND"] == FILE_BASED_CACHE:
+    # Cart PDFs, relation sets and their version tokens take several entries
+    # per user; culling at Django's default of 300 would evict the tokens and
+    # drop cached data at random.
+    CACHES["default"]["OPTIONS"] = {
+        "MAX_ENTRIES": int(config.get("CACHE_MAX_ENTRIES", 100000)),
+    }
+
+if TESTING:
+    CACHES["default"] = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    # Test fixtures create many users; the default hasher is slow by design.
+    PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
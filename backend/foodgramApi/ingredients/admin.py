@@ -1,4 +1,6 @@
 from django.contrib import admin
+from django.db.models import Count
+from api.admin_utils import EstimatedCountPaginator
 from .models import Ingredient
 
 
@@ -8,7 +10,16 @@ class IngredientAdmin(admin.ModelAdmin):
     search_fields = ("name", "measurement_unit")
     list_filter = ("measurement_unit", )
     ordering = ("name",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-    @admin.display(description="Число рецептов")
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        # Counting for the changelist only; autocomplete lookups skip the join.
+        if request.resolver_match and request.resolver_match.url_name.endswith("changelist"):
+            queryset = queryset.annotate(recipe_count=Count("recipes"))
+        return queryset
+
+    @admin.display(description="Число рецептов", ordering="recipe_count")
     def recipe_count(self, ingredient):
-        return ingredient.recipes.count()
+        return ingredient.recipe_count
@@ -0,0 +1,61 @@
+"""
+In-process prefix index over the ingredient catalog.
+
+The catalog is small and rarely changes, so every worker keeps a sorted
+array of casefolded names and answers autocomplete lookups with a binary
+search. A catalog version stored in the shared cache tells the workers when
+to rebuild; it changes whenever ingredients are saved, deleted or loaded.
+"""
+from bisect import bisect_left
+
+from foodgramApi.cache_versions import get_version, invalidate_versions
+from .models import Ingredient
+
+CATALOG_VERSION_KEY = "ingredients:catalog_version"
+
+_index = None
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    invalidate_versions([CATALOG_VERSION_KEY])
+
+
+class IngredientIndex:
+    def __init__(self, ingredients, version=None):
+        entries = sorted(
+            (name.casefold(), name, pk, measurement_unit)
+            for pk, name, measurement_unit in ingredients
+        )
+        self.version = version
+        self._keys = [entry[0] for entry in entries]
+        self._items = [
+            {"id": pk, "name": name, "measurement_unit": measurement_unit}
+            for _, name, pk, measurement_unit in entries
+        ]
+
+    def __len__(self):
+        return len(self._items)
+
+    def search(self, prefix="", limit=None):
+        """Ingredients whose name starts with ``prefix``, ignoring case."""
+        prefix = prefix.casefold()
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix + chr(0x10FFFF), lo=start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return self._items[start:end]
+
+
+def get_ingredient_index():
+    global _index
+    version = get_catalog_version()
+    if _index is None or _index.version != version:
+        _index = IngredientIndex(
+            Ingredient.objects.values_list("id", "name", "measurement_unit"),
+            version=version,
+        )
+    return _index
@@ -1,36 +1,184 @@
+import csv
+import io
 import json
-from django.core.management.base import BaseCommand
+import re
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
 from recipes.models import Ingredient
+from ingredients.catalog import bump_catalog_version
+
+NAME_MAX_LENGTH = Ingredient._meta.get_field("name").max_length
+UNIT_MAX_LENGTH = Ingredient._meta.get_field("measurement_unit").max_length
+MAX_REPORTED_ERRORS = 20
+SEPARATORS = re.compile(r"[\s,]*")
+NUMBER_TAIL = re.compile(r"[\d.eE+\-\s]*\Z")
+
+
+def iter_csv(file):
+    """Yield ``(line, fields)`` for the ``name,measurement_unit`` rows."""
+    for line, row in enumerate(csv.reader(file), start=1):
+        if row:
+            yield line, row
+
+
+def iter_json(file, chunk_size=64 * 1024):
+    """
+    Yield ``(item, fields)`` for a JSON array of objects, decoding one
+    element at a time instead of loading the whole document.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def read_more():
+        chunk = file.read(chunk_size)
+        return buffer[pos:] + chunk, 0, not chunk
+
+    # Leading whitespace may fill whole chunks.
+    while (pos := SEPARATORS.match(buffer, pos).end()) == len(buffer) and not eof:
+        buffer, pos, eof = read_more()
+    if buffer[pos:pos + 1] != "[":
+        raise CommandError("JSON file must contain an array of ingredients")
+    pos += 1
+    item = 0
+    while True:
+        pos = SEPARATORS.match(buffer, pos).end()
+        if pos == len(buffer) and not eof:
+            buffer, pos, eof = read_more()
+            continue
+        if buffer[pos:pos + 1] == "]":
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as error:
+            if eof:
+                raise CommandError(f"Invalid JSON after item {item}: {error}")
+            buffer, pos, eof = read_more()
+            continue
+        # A number cut off by the chunk boundary decodes as its prefix, so
+        # decode it again once the next chunk shows where it ends.
+        if NUMBER_TAIL.match(buffer, end) and not eof:
+            buffer, pos, eof = read_more()
+            continue
+        pos = end
+        item += 1
+        yield item, value
+
+
+def parse_fields(fields):
+    """``(name, measurement_unit)`` of a CSV row or a JSON object."""
+    if isinstance(fields, dict):
+        fields = (fields.get("name"), fields.get("measurement_unit"))
+    elif not isinstance(fields, list) or len(fields) != 2:
+        raise ValueError("expected a name and a measurement unit")
+    name, measurement_unit = (
+        value.strip() if isinstance(value, str) else "" for value in fields
+    )
+    if not name or not measurement_unit:
+        raise ValueError("name and measurement_unit are required")
+    if len(name) > NAME_MAX_LENGTH or len(measurement_unit) > UNIT_MAX_LENGTH:
+        raise ValueError("name or measurement_unit is too long")
+    return name, measurement_unit
 
 
 class Command(BaseCommand):
-    help = "Load ingredients from JSON file"
+    help = "Load ingredients from a CSV (name,measurement_unit) or JSON file"
 
     def add_arguments(self, parser):
-        parser.add_argument("json_file", type=str, help="Path to JSON file")
+        parser.add_argument("path", type=str, help="Path to a CSV or JSON file")
+        parser.add_argument(
+            "--format", choices=("csv", "json"),
+            help="File format, detected from the extension by default",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
 
     def handle(self, *args, **options):
-        file_path = options["json_file"]
+        path = Path(options["path"])
+        file_format = options["format"] or path.suffix.lstrip(".").lower()
+        if file_format not in ("csv", "json"):
+            raise CommandError(f"Unknown file format '{file_format}', use --format")
+
+        started = time.monotonic()
+        self.errors = []
+        existing = dict(Ingredient.objects.values_list("name", "measurement_unit"))
+        insert_batch = self._copy_batch if connection.vendor == "postgresql" else self._bulk_create_batch
 
+        read = created = 0
         try:
-            with open(file_path, "r", encoding="utf-8") as file:
-                ingredients_to_create = [
-                    Ingredient(**item)
-                    for item in json.load(file)
-                    if not Ingredient.objects.filter(
-                        name=item["name"],
-                        measurement_unit=item["measurement_unit"]
-                    ).exists()
-                ]
-                
-                created_count = len(Ingredient.objects.bulk_create(ingredients_to_create))
-                
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f"Successfully loaded {created_count} ingredients"
-                    )
+            with open(path, encoding="utf-8", newline="") as file:
+                rows = self._clean_rows(iter_csv(file) if file_format == "csv" else iter_json(file), existing)
+                with transaction.atomic():
+                    while batch := list(islice(rows, options["batch_size"])):
+                        created += insert_batch(batch)
+                read = self.rows_read
+        except (OSError, UnicodeDecodeError) as error:
+            raise CommandError(f"Cannot read {path}: {error}")
+
+        bump_catalog_version()
+        for location, message in self.errors[:MAX_REPORTED_ERRORS]:
+            self.stderr.write(self.style.WARNING(f"{path}:{location}: {message}"))
+        if len(self.errors) > MAX_REPORTED_ERRORS:
+            self.stderr.write(self.style.WARNING(f"... and {len(self.errors) - MAX_REPORTED_ERRORS} more errors"))
+
+        elapsed = time.monotonic() - started
+        rate = read / elapsed if elapsed else read
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully loaded {created} ingredients: {read} rows read, "
+                f"{read - created - len(self.errors)} already present, {len(self.errors)} errors "
+                f"in {elapsed:.2f}s ({rate:.0f} rows/s)"
+            )
+        )
+
+    def _clean_rows(self, rows, existing):
+        """Validate rows and drop the ones already in the catalog."""
+        self.rows_read = 0
+        for location, fields in rows:
+            self.rows_read += 1
+            try:
+                name, measurement_unit = parse_fields(fields)
+            except ValueError as error:
+                self.errors.append((location, str(error)))
+                continue
+            if name not in existing:
+                existing[name] = measurement_unit
+                yield name, measurement_unit
+            elif existing[name] != measurement_unit:
+                self.errors.append(
+                    (location, f"'{name}' already exists with measurement unit '{existing[name]}'")
                 )
-        except Exception:
-            self.stdout.write(
-                self.style.ERROR("Error loading ingredients")
+
+    def _bulk_create_batch(self, batch):
+        return len(Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit) for name, unit in batch],
+            ignore_conflicts=True,
+        ))
+
+    def _copy_batch(self, batch):
+        """COPY the batch into a staging table and merge it on PostgreSQL."""
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS ingredient_staging "
+                f"(name varchar({NAME_MAX_LENGTH}), measurement_unit varchar({UNIT_MAX_LENGTH})) "
+                "ON COMMIT DROP"
+            )
+            cursor.copy_expert(
+                "COPY ingredient_staging (name, measurement_unit) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+            cursor.execute(
+                f"INSERT INTO {table} (name, measurement_unit) "
+                "SELECT name, measurement_unit FROM ingredient_staging "
+                "ON CONFLICT DO NOTHING"
             )
+            created = cursor.rowcount
+            cursor.execute("TRUNCATE ingredient_staging")
+        return created
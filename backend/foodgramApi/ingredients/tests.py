@@ -0,0 +1,88 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from .catalog import IngredientIndex, get_ingredient_index
+from .management.commands.load_ingredients import iter_json
+from .models import Ingredient
+
+
+class IngredientIndexTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_prefix_search_ignores_case(self):
+        index = IngredientIndex([
+            (1, "Сахар", "г"),
+            (2, "сахарная пудра", "г"),
+            (3, "соль", "г"),
+            (4, "Яблоко", "шт."),
+        ])
+        self.assertEqual([item["id"] for item in index.search("САХ")], [1, 2])
+        self.assertEqual([item["id"] for item in index.search("сахар", limit=1)], [1])
+        self.assertEqual([item["id"] for item in index.search("")], [1, 2, 3, 4])
+        self.assertEqual(index.search("мука"), [])
+
+    def test_index_is_rebuilt_when_catalog_changes(self):
+        Ingredient.objects.create(name="мука", measurement_unit="г")
+        with self.captureOnCommitCallbacks(execute=True):
+            index = get_ingredient_index()
+        with self.assertNumQueries(0):
+            self.assertIs(get_ingredient_index(), index)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name="масло", measurement_unit="г")
+        self.assertEqual(
+            [item["name"] for item in get_ingredient_index().search("м")],
+            ["масло", "мука"],
+        )
+
+    def test_list_endpoint(self):
+        Ingredient.objects.create(name="Мука", measurement_unit="г")
+        Ingredient.objects.create(name="мёд", measurement_unit="г")
+        response = self.client.get("/api/ingredients/?name=му&limit=5")
+        self.assertEqual(response.json(), [
+            {"id": Ingredient.objects.get(name="Мука").id, "name": "Мука", "measurement_unit": "г"},
+        ])
+
+
+class LoadIngredientsTestCase(TestCase):
+    def load(self, content, suffix):
+        with tempfile.NamedTemporaryFile("w", suffix=suffix, encoding="utf-8", delete=False) as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command("load_ingredients", file.name, "--batch-size", "2", stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_load_csv(self):
+        Ingredient.objects.create(name="соль", measurement_unit="г")
+        stdout, stderr = self.load("соль,г\nмука,г\nмука,г\nсахар,г\nмасло\nсоль,кг\n", ".csv")
+        self.assertEqual(
+            set(Ingredient.objects.values_list("name", "measurement_unit")),
+            {("соль", "г"), ("мука", "г"), ("сахар", "г")},
+        )
+        self.assertIn("Successfully loaded 2 ingredients: 6 rows read", stdout)
+        self.assertIn(":5: expected a name and a measurement unit", stderr)
+        self.assertIn(":6: 'соль' already exists", stderr)
+
+    def test_load_json(self):
+        stdout, _ = self.load(
+            '[{"name": "мука", "measurement_unit": "г"},\n {"name": "яйца", "measurement_unit": "шт."},'
+            ' {"name": "", "measurement_unit": "г"}]',
+            ".json",
+        )
+        self.assertEqual(Ingredient.objects.count(), 2)
+        self.assertIn("Successfully loaded 2 ingredients: 3 rows read", stdout)
+
+    def test_iter_json_across_chunk_boundaries(self):
+        content = ' \n [1234, {"name": "мука", "measurement_unit": "г"}, true, 5.6e2]'
+        expected = [(1, 1234), (2, {"name": "мука", "measurement_unit": "г"}), (3, True), (4, 560.0)]
+        for chunk_size in (1, 2, 3, 5, 64 * 1024):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(list(iter_json(StringIO(content), chunk_size=chunk_size)), expected)
+        self.assertEqual(list(iter_json(StringIO("  []"), chunk_size=1)), [])
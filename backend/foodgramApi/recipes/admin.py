@@ -1,42 +1,71 @@
 from django.contrib import admin
+from django.db.models import Prefetch
 from django.utils.safestring import mark_safe
+from api.admin_utils import EstimatedCountPaginator, InputFilter
 from .models import Recipe, RecipeIngredient
 
 
+class AuthorFilter(InputFilter):
+    title = "автору (логин)"
+    parameter_name = "author"
+    lookup = "author__username"
+
+
+class RecipeNameFilter(InputFilter):
+    title = "рецепту"
+    parameter_name = "recipe_name"
+    lookup = "recipe__name__istartswith"
+
+
+class IngredientNameFilter(InputFilter):
+    title = "продукту"
+    parameter_name = "ingredient_name"
+    lookup = "ingredient__name__istartswith"
+
+
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
     extra = 1
     min_num = 1
+    autocomplete_fields = ("ingredient",)
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ("id", "name", "cooking_time", "author", "favorite_count", "ingredients_display", "image_display")
+    list_display = ("id", "name", "cooking_time", "author", "favorites_count", "in_carts_count", "ingredients_display", "image_display")
+    list_select_related = ("author",)
     search_fields = (
         "name",
         "author__username",
         "author__first_name",
         "author__last_name",
     )
-    list_filter = ("author", "created")
+    list_filter = (AuthorFilter, "created")
+    autocomplete_fields = ("author",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     inlines = [RecipeIngredientInline]
-    readonly_fields = ("favorite_count",)
+    readonly_fields = ("favorites_count", "in_carts_count")
     fieldsets = (
         (None, {"fields": ("name", "author",
                            "image", "text", "cooking_time")}),
-        ("Статистика", {"fields": ("favorite_count",)}),
+        ("Статистика", {"fields": ("favorites_count", "in_carts_count")}),
     )
 
-    @admin.display(description="В избранном")
-    def favorite_count(self, recipe):
-        return recipe.favorited_by_users_relations.count()
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer("search_vector").prefetch_related(
+            Prefetch(
+                "recipe_ingredients",
+                queryset=RecipeIngredient.objects.select_related("ingredient"),
+            )
+        )
 
     @admin.display(description="Продукты")
     def ingredients_display(self, recipe):
         ingredients = recipe.recipe_ingredients.all()
-        if not ingredients.exists():
+        if not ingredients:
             return "Нет продуктов"
-        
+
         html_content = "<br>".join(f"{item.ingredient.name}: {item.amount}" for item in ingredients)
         return mark_safe(html_content)
 
@@ -50,5 +79,9 @@ class RecipeAdmin(admin.ModelAdmin):
 @admin.register(RecipeIngredient)
 class RecipeIngredientAdmin(admin.ModelAdmin):
     list_display = ("recipe", "ingredient", "amount")
+    list_select_related = ("recipe", "ingredient")
     search_fields = ("recipe__name", "ingredient__name")
-    list_filter = ("recipe", "ingredient")
+    list_filter = (RecipeNameFilter, IngredientNameFilter)
+    autocomplete_fields = ("recipe", "ingredient")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,183 @@
+import random
+import time
+from io import StringIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.models import Favorite, ShoppingCart, Subscription
+from ingredients.models import Ingredient
+from recipes.models import Recipe, RecipeIngredient
+
+User = get_user_model()
+
+PLACEHOLDER_IMAGE = "recipes/images/placeholder.png"
+
+
+def zipf_cum_weights(size, exponent):
+    """Cumulative weights of a power law over ranks 1..size."""
+    return list(accumulate(1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic dataset of users, recipes, favorites, shopping "
+        "carts and subscriptions for load and scale testing"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=10000)
+        parser.add_argument("--favorites", type=int, default=50000)
+        parser.add_argument("--carts", type=int, default=10000)
+        parser.add_argument("--subscriptions", type=int, default=20000)
+        parser.add_argument(
+            "--ingredients-per-recipe", type=int, nargs=2, default=(3, 12),
+            metavar=("MIN", "MAX"),
+        )
+        parser.add_argument(
+            "--skew", type=float, default=1.1,
+            help="Exponent of the power law used for author and recipe popularity",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--prefix", default="gen",
+            help="Prefix of generated usernames and emails",
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.skew = options["skew"]
+
+        ingredient_ids = list(Ingredient.objects.values_list("id", flat=True))
+        if not ingredient_ids:
+            raise CommandError("The ingredient catalog is empty, run load_ingredients first")
+        if User.objects.filter(username__startswith=f"{options['prefix']}_").exists():
+            raise CommandError(f"Users with the prefix '{options['prefix']}' already exist")
+
+        user_ids = self._generate_users(options["users"], options["prefix"])
+        recipe_ids = self._generate_recipes(
+            options["recipes"], user_ids, ingredient_ids, options["ingredients_per_recipe"]
+        )
+        self._generate_relations(Favorite, "recipe", options["favorites"], user_ids, recipe_ids)
+        self._generate_relations(ShoppingCart, "recipe", options["carts"], user_ids, recipe_ids)
+        self._generate_relations(Subscription, "author", options["subscriptions"], user_ids, user_ids)
+        # bulk_create bypasses the signals that maintain the counters.
+        output = StringIO()
+        call_command("reconcile_counters", batch_size=self.batch_size, stdout=output)
+        self.stdout.write(output.getvalue(), ending="")
+
+    def _chunks(self, total):
+        for start in range(0, total, self.batch_size):
+            yield range(start, min(start + self.batch_size, total))
+
+    def _report(self, label, count, started):
+        elapsed = time.monotonic() - started
+        rate = count / elapsed if elapsed else count
+        self.stdout.write(
+            self.style.SUCCESS(f"{label}: {count} rows in {elapsed:.1f}s ({rate:.0f} rows/s)")
+        )
+
+    def _generate_users(self, total, prefix):
+        started = time.monotonic()
+        password = make_password(None)
+        for chunk in self._chunks(total):
+            User.objects.bulk_create(
+                User(
+                    username=f"{prefix}_{n}",
+                    email=f"{prefix}_{n}@example.com",
+                    first_name="Имя",
+                    last_name=f"Фамилия {n}",
+                    password=password,
+                )
+                for n in chunk
+            )
+        self._report("Users", total, started)
+        return list(
+            User.objects.filter(username__startswith=f"{prefix}_")
+            .order_by("id").values_list("id", flat=True)
+        )
+
+    def _generate_recipes(self, total, user_ids, ingredient_ids, ingredients_per_recipe):
+        started = time.monotonic()
+        if not user_ids:
+            return []
+        min_ingredients, max_ingredients = ingredients_per_recipe
+        max_ingredients = min(max_ingredients, len(ingredient_ids))
+        min_ingredients = min(min_ingredients, max_ingredients)
+        # A few prolific authors and a few staple ingredients dominate.
+        author_weights = zipf_cum_weights(len(user_ids), self.skew)
+        ingredient_weights = zipf_cum_weights(len(ingredient_ids), self.skew)
+
+        recipe_ids = []
+        rows = 0
+        for chunk in self._chunks(total):
+            authors = self.random.choices(user_ids, cum_weights=author_weights, k=len(chunk))
+            with transaction.atomic():
+                recipes = Recipe.objects.bulk_create(
+                    Recipe(
+                        author_id=author_id,
+                        name=f"Рецепт {n}",
+                        text=f"Описание рецепта {n}",
+                        cooking_time=self.random.randint(5, 240),
+                        image=PLACEHOLDER_IMAGE,
+                    )
+                    for n, author_id in zip(chunk, authors)
+                )
+                recipe_ingredients = []
+                for recipe in recipes:
+                    count = self.random.randint(min_ingredients, max_ingredients)
+                    chosen = set(
+                        self.random.choices(ingredient_ids, cum_weights=ingredient_weights, k=count)
+                    )
+                    recipe_ingredients.extend(
+                        RecipeIngredient(
+                            recipe_id=recipe.id,
+                            ingredient_id=ingredient_id,
+                            amount=self.random.randint(1, 1000),
+                        )
+                        for ingredient_id in sorted(chosen)
+                    )
+                RecipeIngredient.objects.bulk_create(recipe_ingredients, batch_size=self.batch_size)
+            recipe_ids.extend(recipe.id for recipe in recipes)
+            rows += len(recipe_ingredients)
+        self._report("Recipes", total, started)
+        self._report("Recipe ingredients", rows, started)
+        return recipe_ids
+
+    def _generate_relations(self, model, target_field, total, user_ids, target_ids):
+        """
+        Create up to ``total`` unique (user, target) rows. Users are uniform,
+        targets follow the power law, so popular recipes and authors collect
+        most of the rows.
+        """
+        started = time.monotonic()
+        if not user_ids or not target_ids:
+            return
+        target_weights = zipf_cum_weights(len(target_ids), self.skew)
+        # Pairs are packed into single ints to keep the set compact.
+        stride = max(target_ids) + 1
+        seen = set()
+        created = 0
+        attempts = 0
+        while created < total and attempts < total * 3:
+            size = min(self.batch_size, total - created)
+            attempts += size
+            users = self.random.choices(user_ids, k=size)
+            targets = self.random.choices(target_ids, cum_weights=target_weights, k=size)
+            objects = []
+            for user_id, target_id in zip(users, targets):
+                pair = user_id * stride + target_id
+                if (model is Subscription and user_id == target_id) or pair in seen:
+                    continue
+                seen.add(pair)
+                objects.append(model(user_id=user_id, **{f"{target_field}_id": target_id}))
+            model.objects.bulk_create(objects, ignore_conflicts=True)
+            created += len(objects)
+        self._report(model._meta.verbose_name_plural, created, started)
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ingredients", "0002_alter_ingredient_measurement_unit_and_more"),
+        ("recipes", "0010_recipe_search_vector"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # The composite index replaces the single-column one on ingredient_id.
+        migrations.AddIndex(
+            model_name="recipeingredient",
+            index=models.Index(fields=["ingredient", "recipe"], name="recipe_ingredient_lookup_idx"),
+        ),
+        migrations.AlterField(
+            model_name="recipeingredient",
+            name="ingredient",
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name="recipe_ingredients", to="ingredients.ingredient", verbose_name="Ингредиент"),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["cooking_time"], name="recipe_cooking_time_idx"),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ingredients", "0002_alter_ingredient_measurement_unit_and_more"),
+        ("recipes", "0012_recipe_author_created_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["image"], name="recipe_image_idx"),
+        ),
+    ]
@@ -1,8 +1,10 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MinLengthValidator
 
 from ingredients.models import Ingredient
+from users.models import DenormalizedCountersMixin
 
 User = get_user_model()
 
@@ -11,11 +13,13 @@ MIN_INGREDIENT_AMOUNT = 1
 
 
 # Рецепт
-class Recipe(models.Model):
+class Recipe(DenormalizedCountersMixin, models.Model):
     author = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name="recipes",
-        verbose_name="Автор"
+        verbose_name="Автор",
+        # Covered by recipe_author_created_idx, which leads with it.
+        db_index=False,
     )
     name = models.CharField(
         "Название",
@@ -35,11 +39,26 @@ class Recipe(models.Model):
         "Время приготовления (в минутах)", validators=[MinValueValidator(MIN_COOKING_TIME)]
     )
     created = models.DateTimeField("Дата публикации", auto_now_add=True)
+    updated = models.DateTimeField("Дата изменения", auto_now=True)
+    favorites_count = models.PositiveIntegerField("В избранном", default=0, editable=False)
+    in_carts_count = models.PositiveIntegerField("В списках покупок", default=0, editable=False)
+    # Maintained by a database trigger on PostgreSQL, see migration 0010.
+    search_vector = SearchVectorField("Поисковый вектор", null=True, editable=False)
+
+    counter_fields = ("favorites_count", "in_carts_count")
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
-        ordering = ("-created",)
+        ordering = ("-created", "id")
+        indexes = [
+            models.Index(fields=["-created", "id"], name="recipe_created_id_idx"),
+            # Author pages and the per-author window on the subscriptions page.
+            models.Index(fields=["author", "-created", "id"], name="recipe_author_created_idx"),
+            # Reference lookups of collect_orphaned_media.
+            models.Index(fields=["image"], name="recipe_image_idx"),
+            models.Index(fields=["cooking_time"], name="recipe_cooking_time_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -58,6 +77,8 @@ class RecipeIngredient(models.Model):
         on_delete=models.CASCADE,
         related_name="recipe_ingredients",
         verbose_name="Ингредиент",
+        # Covered by recipe_ingredient_lookup_idx, which leads with it.
+        db_index=False,
     )
     amount = models.PositiveIntegerField(
         "Количество", validators=[MinValueValidator(MIN_INGREDIENT_AMOUNT)]
@@ -72,6 +93,9 @@ class RecipeIngredient(models.Model):
                 name="unique_recipe_ingredient"
             )
         ]
+        indexes = [
+            models.Index(fields=["ingredient", "recipe"], name="recipe_ingredient_lookup_idx"),
+        ]
 
     def __str__(self):
         return (
@@ -3,43 +3,31 @@ from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
+from api.admin_utils import EstimatedCountPaginator, HasRelationFilter
+from api.models import Subscription
+from recipes.models import Recipe
 from .models import User
 
 
-class BaseHasRelationFilter(admin.SimpleListFilter):
-    LOOKUP_CHOICES = (
-        ("yes", _("Да")),
-        ("no", _("Нет")),
-    )
-    relation_field = None  # Должно быть переопределено в подклассах
-
-    def lookups(self, request, model_admin):
-        return self.LOOKUP_CHOICES
-
-    def queryset(self, request, queryset):
-        if self.value() == "yes":
-            return queryset.filter(**{f"{self.relation_field}__isnull": False}).distinct()
-        if self.value() == "no":
-            return queryset.filter(**{f"{self.relation_field}__isnull": True}).distinct()
-        return queryset
-    
-
-class UserHasRecipesFilter(BaseHasRelationFilter):
+class UserHasRecipesFilter(HasRelationFilter):
     title = _("есть рецепты")
     parameter_name = "has_recipes"
-    relation_field = "recipes"
+    related_model = Recipe
+    related_field = "author"
 
 
-class UserHasSubscriptionsFilter(BaseHasRelationFilter):
+class UserHasSubscriptionsFilter(HasRelationFilter):
     title = _("есть подписки")
     parameter_name = "has_subscriptions"
-    relation_field = "subscriptions"
+    related_model = Subscription
+    related_field = "user"
 
 
-class UserHasSubscribersFilter(BaseHasRelationFilter):
+class UserHasSubscribersFilter(HasRelationFilter):
     title = _("есть подписчики")
     parameter_name = "has_subscribers"
-    relation_field = "subscribers"
+    related_model = Subscription
+    related_field = "author"
 
 
 @admin.register(User)
@@ -50,9 +38,9 @@ class ExtendedUserAdmin(UserAdmin):
         "get_full_name",
         "email",
         "get_avatar_preview",
-        "get_recipes_count",
-        "get_subscriptions_count",
-        "get_subscribers_count",
+        "recipes_count",
+        "following_count",
+        "followers_count",
         "is_staff",
         "is_active",
     )
@@ -65,6 +53,8 @@ class ExtendedUserAdmin(UserAdmin):
         UserHasSubscribersFilter,
     )
     ordering = ("username",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = (
         (None, {"fields": ("username", "password")}),
         ("Personal info", {"fields": ("first_name",
@@ -77,9 +67,10 @@ class ExtendedUserAdmin(UserAdmin):
         ("Important dates", {"fields": ("last_login", "date_joined")}),
         (
             "Additional info",
-            {"fields": ("shopping_cart", "favorites")},
+            {"fields": ("recipes_count", "following_count", "followers_count")},
         ),
     )
+    readonly_fields = ("recipes_count", "following_count", "followers_count")
     add_fieldsets = (
         (
             None,
@@ -99,15 +90,3 @@ class ExtendedUserAdmin(UserAdmin):
         if user.avatar:
             return mark_safe(f'<img src="{user.avatar.url}" width="50" height="50" />')
         return "Нет аватара"
-
-    @admin.display(description="Рецептов")
-    def get_recipes_count(self, user):
-        return user.recipes.count()
-
-    @admin.display(description="Подписок")
-    def get_subscriptions_count(self, user):
-        return user.following.count()
-
-    @admin.display(description="Подписчиков")
-    def get_subscribers_count(self, user):
-        return user.followers.count()
@@ -3,8 +3,32 @@ from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 
 
+class DenormalizedCountersMixin:
+    """
+    Leaves ``counter_fields`` out of saves of existing rows. The counters are
+    only changed by ``F()`` updates, which saving a stale in-memory value
+    would undo.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            skipped = {*self.counter_fields, *self.get_deferred_fields()}
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+
 # Пользователь
-class User(AbstractUser):
+class User(DenormalizedCountersMixin, AbstractUser):
     username = models.CharField(
         "Логин",
         max_length=150,
@@ -22,6 +46,11 @@ class User(AbstractUser):
         "Аватар", upload_to="users/",
         blank=True, null=True, default="userpic-icon.jpg"
     )
+    recipes_count = models.PositiveIntegerField("Рецептов", default=0, editable=False)
+    followers_count = models.PositiveIntegerField("Подписчиков", default=0, editable=False)
+    following_count = models.PositiveIntegerField("Подписок", default=0, editable=False)
+
+    counter_fields = ("recipes_count", "followers_count", "following_count")
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -30,6 +59,10 @@ class User(AbstractUser):
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
         ordering = ("username",)
+        indexes = [
+            # Reference lookups of collect_orphaned_media.
+            models.Index(fields=["avatar"], name="user_avatar_idx"),
+        ]
 
     def __str__(self):
         return self.username